@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Parser Benchmarks
+Generates synthetic clock.log / skew-report files and measures each log parser's
+throughput (MB/s), peak resident memory (RSS growth over the process baseline, so
+mmap'd pages and C-level buffers count) and correctness against the generator's
+reference results.
+"""
+
+import argparse
+import contextlib
+import io
+import logging
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cts_log_parser  # noqa: E402
+import parse_cts_report  # noqa: E402
+from extract_usable_cells_parameterized import extract_cells_from_log  # noqa: E402
+from gen_clock_log import add_generator_args, config_from_args, generate  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class BenchResult:
+    name: str
+    size_mb: float
+    seconds: float
+    peak_mb: float
+    correct: bool
+    detail: str
+
+    @property
+    def throughput(self) -> float:
+        return self.size_mb / self.seconds if self.seconds > 0 else float('inf')
+
+def _close(a, b) -> bool:
+    return a is not None and b is not None and all(abs(x - y) < 1e-9 for x, y in zip(a, b))
+
+def check_clock_log(expected: Dict) -> Callable[[], tuple]:
+    def run():
+        table = cts_log_parser.parse_clock_log(expected['clock_log'])
+        worst = table.worst()
+        ok = len(table) == expected['log_rows'] and _close(worst, expected['log_worst'])
+        return ok, f"rows={len(table)}/{expected['log_rows']} worst={worst}"
+    return run
+
+def check_skew_table_report(expected: Dict) -> Callable[[], tuple]:
+    def run():
+        table = cts_log_parser.parse_skew_report(expected['skew_report'])
+        return len(table) == expected['report_rows'], f"rows={len(table)}/{expected['report_rows']}"
+    return run
+
+def check_parse_skew_report(expected: Dict) -> Callable[[], tuple]:
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = parse_cts_report.parse_skew_report(expected['skew_report'])
+        return _close(result, expected['report_first_setup_late']), f"result={result}"
+    return run
+
+def check_extract_cells(expected: Dict) -> Callable[[], tuple]:
+    def run():
+        buffers, inverters = extract_cells_from_log(expected['clock_log'])
+        ok = buffers == expected['buffers'] and inverters == expected['inverters']
+        return ok, f"buffers={len(buffers)}/{len(expected['buffers'])} inverters={len(inverters)}/{len(expected['inverters'])}"
+    return run
+
+def _run_in_child(fn: Callable[[], tuple], conn):
+    # ru_maxrss is in KiB on Linux; the forked child starts at the parent's RSS
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    ok, detail = fn()
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    conn.send((ok, detail, (peak - baseline) * 1024))
+    conn.close()
+
+def measure(fn: Callable[[], tuple]) -> tuple:
+    """
+    Runs `fn` once in a forked child and returns (ok, detail, peak RSS growth in
+    bytes), so each parser's high-water mark is its own and includes mmap'd pages.
+    """
+    parent_conn, child_conn = multiprocessing.Pipe(duplex=False)
+    proc = multiprocessing.get_context('fork').Process(target=_run_in_child, args=(fn, child_conn))
+    proc.start()
+    child_conn.close()
+    result = parent_conn.recv()
+    proc.join()
+    return result
+
+def bench(name: str, path: str, fn: Callable[[], tuple], repeat: int) -> BenchResult:
+    """Best-of-`repeat` wall time; peak RSS and correctness from a first run in a child process."""
+    ok, detail, peak = measure(fn)
+
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return BenchResult(name, os.path.getsize(path) / 1e6, best, peak / 1e6, ok, detail)
+
+def run_benchmarks(expected: Dict, repeat: int) -> List[BenchResult]:
+    cases = [
+        ("cts_log_parser.parse_clock_log", expected['clock_log'], check_clock_log(expected)),
+        ("extract_cells_from_log", expected['clock_log'], check_extract_cells(expected)),
+        ("cts_log_parser.parse_skew_report", expected['skew_report'], check_skew_table_report(expected)),
+        ("parse_cts_report.parse_skew_report", expected['skew_report'], check_parse_skew_report(expected)),
+    ]
+    return [bench(name, path, fn, repeat) for name, path, fn in cases]
+
+def print_results(results: List[BenchResult]):
+    print(f"{'parser':<38}{'MB':>9}{'MB/s':>10}{'peak RSS MB':>13}  {'ok':<4}detail")
+    for r in results:
+        print(f"{r.name:<38}{r.size_mb:>9.1f}{r.throughput:>10.1f}{r.peak_mb:>13.2f}  {'yes' if r.correct else 'NO':<4}{r.detail}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the clock.log / skew report parsers")
+    add_generator_args(parser)
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per parser (best is reported)")
+    parser.add_argument("--workdir", help="Keep generated files here instead of a temp directory")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s [%(levelname)s] %(message)s')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        expected = generate(config_from_args(args, args.workdir or tmp))
+        results = run_benchmarks(expected, args.repeat)
+    print_results(results)
+    sys.exit(0 if all(r.correct for r in results) else 1)
+
+if __name__ == "__main__":
+    main()
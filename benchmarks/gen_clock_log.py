@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Synthetic Innovus log generator
+Writes a realistic clock.log (noise lines, usable-cell lists, repeated skew-group
+summary tables) and a report_ccopt_skew_groups-style report, plus an expected.json
+with the reference results every parser should reproduce.
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+from dataclasses import dataclass
+from typing import Dict, List
+
+# --- Logging Configuration ---
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s [%(levelname)s] %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+logger = logging.getLogger(__name__)
+
+# Line prefix styles seen in Innovus/Bob logs
+PREFIX_STYLES = ('innovus', 'debug', 'none')
+
+NOISE_TEMPLATES = [
+    "(IMPCCOPT-1041) The skew target of {v:.3f}ns for the clock tree clk_{n} has been honored.",
+    "CCOpt::Phase::Construction... Clustering... (cpu={n}:00:0{d}.0 real={n}:00:0{d}.0 mem={m}.2M)",
+    "(IMPCCOPT-2002) Did not meet the max transition constraint on {n} nets; worst {v:.4f}ns.",
+    "Routing clock nets: {n} of {m} done. Net clk_gate_{d}/Q wire length {v:.2f}um",
+    "Moving {n} instances: legalization done. Displacement max={v:.3f}um avg={v:.4f}um",
+]
+
+@dataclass
+class GenConfig:
+    out_dir: str
+    size_mb: float
+    corners: int
+    skew_groups: int
+    tables: int
+    prefix_style: str
+    cells: int
+    seed: int
+
+def _prefix(style: str, rng: random.Random, level: str = 'INFO') -> str:
+    if style == 'innovus':
+        return f"2026-01-14 {rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}:{level}: "
+    if style == 'debug':
+        return f"{level}: "
+    return ''
+
+def _corner_names(n: int) -> List[str]:
+    names = []
+    for i in range(n):
+        if i % 2 == 0:
+            names.append(f"ssgnp_0p{675 + i}v_m40c_cworst_CCworst_T:setup.late")
+        else:
+            names.append(f"ffgnp_0p{880 + i}v_125c_cbest_CCbest:hold.early")
+    return names
+
+def _cell_lists(n: int, rng: random.Random) -> Dict[str, List[str]]:
+    drives = ['0P5', '1', '2', '3', '4', '6', '8', '12', '16', '20', '24']
+    vts = ['ULVT', 'LVT', 'SVT', 'ULVTLL', 'LVTLL']
+    buffers = set()
+    inverters = set()
+    while len(buffers) < n or len(inverters) < n:
+        lib = f"BWP7T{rng.choice(['30', '35', '40'])}P140"
+        if len(buffers) < n:
+            buffers.add(f"{rng.choice(['CKBD', 'BUFFD', 'DCCKBD'])}{rng.choice(drives)}{lib}{rng.choice(vts)}")
+        if len(inverters) < n:
+            inverters.add(f"{rng.choice(['CKND', 'INVD', 'DCCKND'])}{rng.choice(drives)}{lib}{rng.choice(vts)}")
+    return {'buffers': sorted(buffers), 'inverters': sorted(inverters)}
+
+def generate(config: GenConfig) -> Dict:
+    """Writes clock.log, skew_groups.rpt and expected.json into out_dir; returns the expected results."""
+    rng = random.Random(config.seed)
+    os.makedirs(config.out_dir, exist_ok=True)
+    log_path = os.path.join(config.out_dir, 'clock.log')
+    report_path = os.path.join(config.out_dir, 'skew_groups.rpt')
+    target_bytes = int(config.size_mb * 1e6)
+
+    corners = _corner_names(config.corners)
+    groups = [f"CLK/func_{i}" if i % 3 else f"GCLK/scan_{i}" for i in range(config.skew_groups)]
+    cells = _cell_lists(config.cells, rng)
+
+    worst = None
+    n_rows = 0
+    written = 0
+    style = config.prefix_style
+    with open(log_path, 'w') as f:
+        def emit(text: str, level: str = 'INFO'):
+            nonlocal written
+            line = _prefix(style, rng, level) + text + "\n"
+            f.write(line)
+            written += len(line)
+
+        for kind in ('buffers', 'inverters'):
+            names = cells[kind]
+            emit(f"List of usable {kind}: " + " ".join(names[:6]))
+            for i in range(6, len(names), 8):
+                emit("    " + " ".join(names[i:i + 8]))
+            emit(f"Total number of usable {kind}: {len(names)}")
+
+        # Spread the summary tables evenly through the noise
+        table_every = max(1, target_bytes // (config.tables + 1))
+        tables_written = 0
+        while written < target_bytes or tables_written < config.tables:
+            if tables_written < config.tables and written >= table_every * (tables_written + 1):
+                tables_written += 1
+                emit("Primary reporting skew groups summary", 'DEBUG')
+                emit("Half-corner                                       Skew Group      Min ID  Max ID  Skew   Skew window occupancy", 'DEBUG')
+                emit("-" * 100, 'DEBUG')
+                for corner in corners:
+                    for group in groups:
+                        min_id = rng.uniform(0.05, 0.15)
+                        max_id = f"{min_id + rng.uniform(0.05, 0.2):.3f}"
+                        skew = f"{rng.uniform(0.0, 0.15):.3f}"
+                        emit(f"{corner:<50}{group:<16}{min_id:.3f}   {max_id}   {skew}  100% {{0.000/0.060}}", 'DEBUG')
+                        n_rows += 1
+                        if corner.startswith('ssgnp_') and 'CLK/' in group and (worst is None or float(skew) > worst[1]):
+                            worst = (float(max_id), float(skew))
+                continue
+            template = rng.choice(NOISE_TEMPLATES)
+            emit(template.format(v=rng.random(), n=rng.randint(1, 9999), m=rng.randint(1000, 99999), d=rng.randint(0, 9)))
+
+    report_first = None
+    n_report_rows = 0
+    with open(report_path, 'w') as f:
+        f.write("Skew Group Summary:\n\n")
+        f.write("Half-corner  Skew Group  ID Target  Min ID  Max ID  Avg ID  Std.Dev.  Skew Target Type  Skew Target  Skew  Skew window occupancy\n")
+        f.write("-" * 120 + "\n")
+        for corner in corners:
+            for group in groups:
+                min_id = rng.uniform(0.05, 0.15)
+                max_id = f"{min_id + rng.uniform(0.05, 0.2):.3f}"
+                skew = f"{rng.uniform(0.0, 0.15):.3f}"
+                f.write(f"{corner}  {group}  -  {min_id:.3f}  {max_id}  {min_id + 0.05:.3f}  0.012  ignored  -  {skew}  100% {{0.000/0.060}}\n")
+                n_report_rows += 1
+                if report_first is None and corner.startswith('ssgnp_') and corner.endswith(':setup.late'):
+                    report_first = (float(max_id), float(skew))
+
+    expected = {
+        'clock_log': log_path,
+        'skew_report': report_path,
+        'log_rows': n_rows,
+        'log_worst': list(worst) if worst else None,
+        'report_rows': n_report_rows,
+        'report_first_setup_late': list(report_first) if report_first else None,
+        'buffers': cells['buffers'],
+        'inverters': cells['inverters'],
+    }
+    with open(os.path.join(config.out_dir, 'expected.json'), 'w') as f:
+        json.dump(expected, f, indent=1)
+    logger.info(f"Wrote {log_path} ({os.path.getsize(log_path) / 1e6:.1f} MB, {n_rows} skew rows) and {report_path}")
+    return expected
+
+def add_generator_args(parser: argparse.ArgumentParser):
+    parser.add_argument("--size-mb", type=float, default=50.0, help="Approximate clock.log size")
+    parser.add_argument("--corners", type=int, default=4, help="Half-corners per summary table")
+    parser.add_argument("--skew-groups", type=int, default=6, help="Skew groups per corner")
+    parser.add_argument("--tables", type=int, default=8, help="Skew-group summary tables in clock.log")
+    parser.add_argument("--prefix-style", choices=PREFIX_STYLES, default="innovus", help="Log line prefix style")
+    parser.add_argument("--cells", type=int, default=200, help="Usable buffers/inverters each")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed")
+
+def config_from_args(args: argparse.Namespace, out_dir: str) -> GenConfig:
+    return GenConfig(
+        out_dir=out_dir,
+        size_mb=args.size_mb,
+        corners=args.corners,
+        skew_groups=args.skew_groups,
+        tables=args.tables,
+        prefix_style=args.prefix_style,
+        cells=args.cells,
+        seed=args.seed
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic clock.log / skew report files")
+    parser.add_argument("out_dir", help="Output directory")
+    add_generator_args(parser)
+    args = parser.parse_args()
+    generate(config_from_args(args, args.out_dir))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,502 @@
+#!/usr/bin/env python3
+"""
+Bob Flow Driver
+Python version of the provision/submit/poll logic of run_flow_parameterized.sh. One
+FlowDriver per worker process tracks all of that host's in-flight runs and refreshes
+their pnr/clock status with a single batched `bob info` per poll cycle, so the load on
+the VOV/Bob server stays flat as --concurrency grows. Commands go through a pluggable
+backend: BobBackend runs the real CLI in an environment captured once (module load +
+vovrc), FakeBobBackend simulates runs in-process for local testing.
+"""
+
+import abc
+import argparse
+import fcntl
+import logging
+import os
+import random
+import shutil
+import subprocess
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# --- Logging Configuration ---
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s [%(levelname)s] %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+logger = logging.getLogger(__name__)
+
+# Same exit codes as run_flow_parameterized.sh (FLOW_EXIT_STATUS in run_optuna_optimizer.py)
+EXIT_VALID = 0
+EXIT_FAILED = 1
+EXIT_INVALID = 2
+EXIT_NOT_FOUND = 3
+
+CLOCK_NODE = 'pnr/clock'
+PREREQ_NODES = ['pnr/libgen', 'pnr/setup', 'pnr/floorplan', 'pnr/placeopt']
+PNR_LINK_DIRS = ['setup', 'placeopt', 'libgen', 'floorplan']
+
+# One row per job of every run passed with -r: "<run> <job> <status>"
+INFO_FORMAT = '@RUN@ @JOBNAME@ @STATUS@'
+
+# Same environment setup as the flow scripts
+BOB_ENV_SETUP = (
+    "module purge; module load internal/bob linux/slurm; "
+    "source /usr/local/google/gcpu/tools/altair/flowtracer/vov/2021.2.0/common/etc/vovrc.sh"
+)
+
+OVERRIDES_TCL = 'optuna_overrides.tcl'
+TEMPLATE_MARKER = '.optuna_template_ready'
+
+class ProvisionError(Exception):
+    """A create/link/validate/submit step of a run failed; the run ends as FAILED."""
+
+class CommandBackend(abc.ABC):
+    """Runs `bob ...` commands. `run` returns (exit code, combined output)."""
+    @abc.abstractmethod
+    def run(self, args: List[str], cwd: str) -> Tuple[int, str]:
+        ...
+
+class BobBackend(CommandBackend):
+    """
+    The real Bob CLI. The module/vovrc environment is captured once at construction
+    instead of being re-sourced by every command.
+    """
+    def __init__(self, setup: str = BOB_ENV_SETUP):
+        self.env = self._capture_env(setup)
+
+    @staticmethod
+    def _capture_env(setup: str) -> Dict[str, str]:
+        result = subprocess.run(['bash', '-c', f"{setup} > /dev/null 2>&1; env -0"],
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        env = dict(item.split('=', 1) for item in result.stdout.decode(errors='replace').split('\0') if '=' in item)
+        if result.returncode != 0 or not env:
+            logger.warning("Could not capture the Bob environment; using the current one.")
+            return dict(os.environ)
+        return env
+
+    def run(self, args: List[str], cwd: str) -> Tuple[int, str]:
+        result = subprocess.run(args, cwd=cwd, env=self.env, stdout=subprocess.PIPE,
+                                stderr=subprocess.STDOUT, universal_newlines=True)
+        return result.returncode, result.stdout
+
+class FakeBobBackend(CommandBackend):
+    """
+    In-process stand-in for Bob. `bob create` makes the run directory skeleton, `bob run`
+    queues the clock job for `queue_time` seconds and runs it for `run_time` seconds,
+    after which it ends VALID (writing a clock.log with one random CLK/ skew-group row),
+    FAILED or INVALID with the given rates. Counts the commands it served per verb.
+    """
+    def __init__(self, queue_time: Tuple[float, float] = (0.0, 1.0), run_time: Tuple[float, float] = (1.0, 3.0),
+                 fail_rate: float = 0.0, invalid_rate: float = 0.0, seed: Optional[int] = None):
+        self.queue_time = queue_time
+        self.run_time = run_time
+        self.fail_rate = fail_rate
+        self.invalid_rate = invalid_rate
+        self.rng = random.Random(seed)
+        self.calls: Dict[str, int] = {}
+        self._jobs: Dict[str, Dict[str, object]] = {}  # run dir -> job name -> status or (start, end)
+        self._lock = threading.Lock()
+
+    def run(self, args: List[str], cwd: str) -> Tuple[int, str]:
+        verb = args[1]
+        opts = self._options(args[2:])
+        with self._lock:
+            self.calls[verb] = self.calls.get(verb, 0) + 1
+            if verb == 'info':
+                return 0, "".join(self._info(cwd, run) for run in opts.get('-r', []))
+            run_dir = os.path.join(cwd, (opts.get('-r') or opts.get('--run_dir'))[0])
+            if verb == 'create':
+                for node in PNR_LINK_DIRS + ['clock']:
+                    path = os.path.join(run_dir, 'main', 'pnr', node)
+                    if not os.path.lexists(path):  # Re-created runs keep their (possibly dangling) links
+                        os.makedirs(path)
+                self._jobs[run_dir] = {job: 'INVALID' for job in PREREQ_NODES + [CLOCK_NODE]}
+            elif verb == 'update':
+                jobs = self._jobs.setdefault(run_dir, {job: 'INVALID' for job in PREREQ_NODES + [CLOCK_NODE]})
+                for job in PREREQ_NODES:
+                    jobs[job] = 'VALID'
+            elif verb == 'run':
+                now = time.time()
+                start = now + self.rng.uniform(*self.queue_time)
+                self._jobs.setdefault(run_dir, {})[CLOCK_NODE] = (start, start + self.rng.uniform(*self.run_time))
+            elif verb == 'stop':
+                self._jobs.get(run_dir, {})[CLOCK_NODE] = 'FAILED'
+            return 0, ""
+
+    @staticmethod
+    def _options(args: List[str]) -> Dict[str, List[str]]:
+        opts: Dict[str, List[str]] = {}
+        for flag, value in zip(args, args[1:]):
+            if flag in ('-r', '--run_dir'):
+                opts.setdefault(flag, []).append(value)
+        return opts
+
+    def _info(self, cwd: str, run: str) -> str:
+        run_dir = os.path.join(cwd, run)
+        if run_dir not in self._jobs and os.path.isdir(run_dir):
+            # Copied from a template run: prerequisites come along VALID, the clock job does not
+            self._jobs[run_dir] = {job: 'VALID' for job in PREREQ_NODES}
+        jobs = self._jobs.get(run_dir, {})
+        lines = []
+        for job, state in jobs.items():
+            if isinstance(state, tuple):
+                state = self._advance(run_dir, state)
+                if isinstance(state, str) and state != 'RUNNING':
+                    jobs[job] = state
+            lines.append(f"{run} {job} {state if isinstance(state, str) else 'QUEUED'}\n")
+        return "".join(lines)
+
+    def _advance(self, run_dir: str, window: Tuple[float, float]):
+        """Status of a submitted clock job; finished jobs are resolved (and logged) once."""
+        start, end = window
+        now = time.time()
+        if now < start:
+            return window
+        if now < end:
+            return 'RUNNING'
+        roll = self.rng.random()
+        if roll < self.fail_rate:
+            return 'FAILED'
+        if roll < self.fail_rate + self.invalid_rate:
+            return 'INVALID'
+        self._write_clock_log(run_dir)
+        return 'VALID'
+
+    def _write_clock_log(self, run_dir: str):
+        log_dir = os.path.join(run_dir, 'main', 'pnr', 'clock', 'logs')
+        os.makedirs(log_dir, exist_ok=True)
+        latency = self.rng.uniform(0.2, 0.4)
+        skew = self.rng.uniform(0.03, 0.12)
+        with open(os.path.join(log_dir, 'clock.log'), 'w') as f:
+            f.write("Primary reporting skew groups summary\n")
+            f.write(f"ssgnp_0p675v_m40c_cworst_CCworst_T:setup.late  CLK/core  {latency - skew:.3f}  "
+                    f"{latency:.3f}  {skew:.3f}\n")
+
+def _replace_with_link(path: str, target: str):
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    elif os.path.lexists(path):
+        os.remove(path)
+    os.symlink(target, path)
+
+@dataclass
+class FlowRun:
+    """One run tracked by a FlowDriver. Times are time.time() stamps (None until reached)."""
+    run_name: str
+    log_path: str
+    attach: bool = False
+    status: str = ''
+    retries: int = 0
+    returncode: Optional[int] = None
+    created_at: float = field(default_factory=time.time)
+    submitted_at: Optional[float] = None  # After `bob run`, so queue wait excludes provisioning
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    done: threading.Event = field(default_factory=threading.Event, repr=False)
+    on_done: Optional[Callable[['FlowRun'], None]] = field(default=None, repr=False)
+
+    def wait(self, timeout: Optional[float] = None) -> Optional[int]:
+        """The flow exit code, or None if the run is still going after `timeout` seconds."""
+        self.done.wait(timeout)
+        return self.returncode
+
+class FlowDriver:
+    """
+    Provisions, submits and watches the pnr/clock runs of one worker. A background
+    thread polls every active run with one `bob info`: right away when a run is added,
+    then on an interval that starts at poll_min and doubles up to poll_max while no
+    status changes (failed or empty queries back off the same way). A clock.log mtime
+    or size change (a cheap stat that also works over NFS, checked every poll_min)
+    triggers an immediate query. poll_max stays short because a job's final status
+    change writes nothing to clock.log.
+    """
+    def __init__(self, backend: CommandBackend, wa_name: str, block_name: str, source_dir: str,
+                 poll_min: float = 10, poll_max: float = 60, max_retries: int = 5):
+        self.backend = backend
+        self.run_root = os.path.join(wa_name, 'run')
+        self.block_name = block_name
+        self.source_dir = source_dir
+        self.poll_min = poll_min
+        self.poll_max = poll_max
+        self.max_retries = max_retries
+        self._runs: Dict[str, FlowRun] = {}
+        self._log_stats: Dict[str, Tuple[float, int]] = {}
+        self._fresh: set = set()  # Added since the last query
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._poll_loop, name="bob-driver", daemon=True)
+        self._thread.start()
+
+    # --- Public API ---
+    def start(self, run_name: str, var_file: str, log_path: str, attach: bool = False,
+              template_run: Optional[str] = None, template_var: Optional[str] = None,
+              overrides_tcl: Optional[str] = None,
+              on_done: Optional[Callable[[FlowRun], None]] = None) -> FlowRun:
+        """
+        Provisions and submits `run_name` (or only attaches to it), then tracks it.
+        With `template_run`, the run is a copy of a template built once from `template_var`.
+        `var_file` is relative to WA/run, like the flow script's argument. `on_done(run)`
+        is called from the polling thread when the run finishes.
+        """
+        run = FlowRun(run_name, log_path, attach=attach, on_done=on_done)
+        if not attach:
+            try:
+                if template_run:
+                    self._clone_run(run, template_run, template_var, overrides_tcl)
+                else:
+                    self._create_run(run, run_name, var_file)
+                self._log(run, f"Submitting job: {CLOCK_NODE}")
+                self._bob_checked(run, 'run', '-r', run_name, '--node', CLOCK_NODE)
+            except (ProvisionError, OSError, subprocess.CalledProcessError) as e:
+                self._log(run, f"Provisioning failed: {e}")
+                # A partial run must not be attached to or resubmitted later
+                shutil.rmtree(os.path.join(self.run_root, run_name), ignore_errors=True)
+                self._finish(run, 'FAILED', EXIT_FAILED)
+                return run
+            run.submitted_at = time.time()
+        elif not os.path.isdir(os.path.join(self.run_root, run_name)):
+            self._finish(run, 'NOT_FOUND', EXIT_NOT_FOUND)
+            return run
+        with self._cond:
+            self._runs[run_name] = run
+            self._fresh.add(run_name)
+            self._cond.notify()
+        return run
+
+    def cancel(self, run: FlowRun):
+        """Stops the run's clock job and stops tracking it (it finishes as FAILED)."""
+        with self._cond:
+            self._runs.pop(run.run_name, None)
+        if run.done.is_set():
+            return
+        self._log(run, f"Stopping job {CLOCK_NODE}")
+        code, output = self._bob(run, 'stop', '-r', run.run_name, '--node', CLOCK_NODE)
+        if code != 0:
+            logger.warning(f"Could not cancel Bob job for {run.run_name}: {output.strip()}")
+        self._finish(run, 'FAILED', EXIT_FAILED)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+
+    def query(self, run_names: Sequence[str]) -> Dict[str, Dict[str, str]]:
+        """One batched `bob info` for `run_names`: run -> job -> status ({} if it failed)."""
+        return self._query(run_names) or {}
+
+    def _query(self, run_names: Sequence[str]) -> Optional[Dict[str, Dict[str, str]]]:
+        args = ['bob', 'info', '-O', INFO_FORMAT]
+        for name in run_names:
+            args += ['-r', name]
+        code, output = self.backend.run(args, cwd=self.run_root)
+        if code != 0:
+            logger.warning(f"bob info failed ({code}): {output.strip()[:200]}")
+            return None
+        statuses: Dict[str, Dict[str, str]] = {}
+        for line in output.splitlines():
+            fields = line.split()
+            if len(fields) == 3:
+                run, job, status = fields
+                statuses.setdefault(os.path.basename(run.rstrip('/')), {})[job] = status
+        return statuses
+
+    # --- Provisioning ---
+    def _bob(self, run: FlowRun, *args: str) -> Tuple[int, str]:
+        code, output = self.backend.run(['bob', *args], cwd=self.run_root)
+        if output:
+            self._log(run, output.rstrip())
+        return code, output
+
+    def _bob_checked(self, run: FlowRun, *args: str) -> str:
+        """Runs a bob command and raises ProvisionError if it exits non-zero."""
+        code, output = self._bob(run, *args)
+        if code != 0:
+            raise ProvisionError(f"bob {' '.join(args[:2])} exited with {code}")
+        return output
+
+    def _create_run(self, run: FlowRun, run_dir: str, var_file: str):
+        """
+        bob create, link the prerequisite stages from the reference run, force-validate
+        them. Raises ProvisionError (or OSError) if a step fails.
+        """
+        self._log(run, f"Creating Bob run: {run_dir}")
+        self._bob_checked(run, 'create', '-s', 'pnr', '--var', var_file, '--run_dir', run_dir,
+                  '--block', self.block_name, '--verbose', 'info')
+        pnr_dest = os.path.join(self.run_root, run_dir, 'main', 'pnr')
+        os.makedirs(pnr_dest, exist_ok=True)
+        for name in PNR_LINK_DIRS:
+            _replace_with_link(os.path.join(pnr_dest, name), os.path.join(self.source_dir, 'pnr', name))
+        _replace_with_link(os.path.join(self.run_root, run_dir, 'main', 'syn'), os.path.join(self.source_dir, 'syn'))
+        self._force_validate(run, run_dir)
+
+    def _force_validate(self, run: FlowRun, run_dir: str):
+        self._bob_checked(run, 'update', 'status', '-f', '-i', '-b', self.block_name, '-r', run_dir,
+                  '--force_validate', *PREREQ_NODES)
+
+    def _clone_run(self, run: FlowRun, template_run: str, template_var: str, overrides_tcl: str):
+        """
+        Copies the template run (built once, under a lock shared with the flow script)
+        and drops the trial's overrides into the clock node directory. The template is
+        only marked ready once it was created and validated; a failed build is removed,
+        so the next trial builds it again instead of cloning a broken one.
+        """
+        template_dir = os.path.join(self.run_root, template_run)
+        marker = os.path.join(template_dir, TEMPLATE_MARKER)
+        with open(os.path.join(self.run_root, f".{template_run}.lock"), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if not os.path.exists(marker):
+                shutil.rmtree(template_dir, ignore_errors=True)
+                try:
+                    self._create_run(run, template_run, template_var)
+                except Exception:
+                    shutil.rmtree(template_dir, ignore_errors=True)
+                    raise
+                open(marker, 'w').close()
+
+        run_dir = os.path.join(self.run_root, run.run_name)
+        self._log(run, f"Cloning {template_run} -> {run.run_name}")
+        shutil.rmtree(run_dir, ignore_errors=True)
+        subprocess.run(['cp', '-a', '--reflink=auto', template_dir, run_dir], check=True)
+        os.remove(os.path.join(run_dir, TEMPLATE_MARKER))
+        clock_dir = os.path.join(run_dir, 'main', 'pnr', 'clock')
+        os.makedirs(clock_dir, exist_ok=True)
+        shutil.copyfile(overrides_tcl, os.path.join(clock_dir, OVERRIDES_TCL))
+
+        jobs = self.query([run.run_name]).get(run.run_name, {})
+        if any(jobs.get(node) != 'VALID' for node in PREREQ_NODES):
+            self._log(run, "Cloned prerequisites not VALID; force-validating...")
+            self._force_validate(run, run.run_name)
+
+    # --- Polling ---
+    def _poll_loop(self):
+        interval = self.poll_min
+        next_query = 0.0
+        with self._cond:
+            while not self._closed:
+                if not self._runs:
+                    self._cond.wait()
+                    next_query = 0.0
+                    continue
+                now = time.time()
+                if now < next_query and not self._fresh and not self._log_activity():
+                    self._cond.wait(min(self.poll_min, next_query - now))
+                    continue
+                runs = list(self._runs.values())
+                self._fresh.clear()
+                self._cond.release()
+                try:
+                    changed = self._refresh(runs)
+                except Exception as e:
+                    logger.warning(f"Bob status poll failed: {type(e).__name__}: {e}")
+                    changed = False
+                finally:
+                    self._cond.acquire()
+                interval = self.poll_min if changed else min(interval * 2, self.poll_max)
+                next_query = time.time() + interval
+
+    def _log_activity(self) -> bool:
+        """True if a tracked run's clock.log changed (mtime or size) since the last check."""
+        active = False
+        for name in self._runs:
+            log = os.path.join(self.run_root, name, 'main', 'pnr', 'clock', 'logs', 'clock.log')
+            try:
+                st = os.stat(log)
+            except OSError:
+                continue
+            # Size too: NFS mtimes can be coarser than the writes
+            if self._log_stats.get(name) != (st.st_mtime, st.st_size):
+                self._log_stats[name] = (st.st_mtime, st.st_size)
+                active = True
+        return active
+
+    def _refresh(self, runs: List[FlowRun]) -> bool:
+        """Queries all runs at once and applies their status transitions. True if any changed."""
+        statuses = self._query([run.run_name for run in runs])
+        if statuses is None:
+            return False
+        changed = False
+        for run in runs:
+            status = statuses.get(run.run_name, {}).get(CLOCK_NODE, '')
+            if status != run.status:
+                changed = True
+                self._log(run, f"{CLOCK_NODE} status: {status or 'none'}")
+            run.status = status
+            if status == 'RUNNING' and run.started_at is None:
+                run.started_at = time.time()
+            if status == 'VALID':
+                self._finish(run, 'VALID', EXIT_VALID)
+            elif status == 'FAILED':
+                self._finish(run, 'FAILED', EXIT_FAILED)
+            elif status == 'INVALID':
+                self._retry(run)
+            elif not status and run.attach:
+                self._finish(run, 'NOT_FOUND', EXIT_NOT_FOUND)
+        return changed
+
+    def _retry(self, run: FlowRun):
+        """INVALID usually means a prerequisite lost its forced status: re-validate and resubmit."""
+        run.retries += 1
+        if run.retries > self.max_retries:
+            self._log(run, "Job keeps reverting to INVALID. Aborting.")
+            self._finish(run, 'INVALID', EXIT_INVALID)
+            return
+        self._log(run, f"Job INVALID (Retry {run.retries}/{self.max_retries}). Re-submitting...")
+        try:
+            self._force_validate(run, run.run_name)
+            self._bob_checked(run, 'run', '-r', run.run_name, '--node', CLOCK_NODE, '--force')
+        except ProvisionError as e:
+            # Still INVALID at the next poll, which retries again (or gives up)
+            self._log(run, f"Re-submission failed: {e}")
+        run.status = ''
+
+    def _finish(self, run: FlowRun, status: str, code: int):
+        with self._cond:
+            if run.done.is_set():
+                return  # A cancel raced with the poller
+            self._runs.pop(run.run_name, None)
+            self._fresh.discard(run.run_name)
+            self._log_stats.pop(run.run_name, None)
+            run.finished_at = time.time()
+            run.returncode = code
+            self._log(run, f"FLOW_STATUS: {status}")
+            run.done.set()
+        if run.on_done is not None:
+            try:
+                run.on_done(run)
+            except Exception as e:
+                logger.warning(f"Completion callback for {run.run_name} failed: {type(e).__name__}: {e}")
+
+    def _log(self, run: FlowRun, message: str):
+        with open(run.log_path, 'a') as f:
+            f.write(f"{time.strftime('%Y-%m-%d %H:%M:%S')} {message}\n")
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive N fake Bob runs through one FlowDriver (local test)")
+    parser.add_argument("--runs", type=int, default=8, help="Concurrent runs")
+    parser.add_argument("--wa-name", default="fake_wa", help="Workspace directory to create runs in")
+    parser.add_argument("--poll-min", type=float, default=0.5, help="Fastest status poll (s)")
+    parser.add_argument("--poll-max", type=float, default=4.0, help="Slowest status poll (s)")
+    parser.add_argument("--invalid-rate", type=float, default=0.1, help="Fraction of jobs that end INVALID")
+    args = parser.parse_args()
+
+    os.makedirs(os.path.join(args.wa_name, 'run'), exist_ok=True)
+    os.makedirs("logs", exist_ok=True)
+    backend = FakeBobBackend(invalid_rate=args.invalid_rate, seed=0)
+    driver = FlowDriver(backend, args.wa_name, 'fake_block', os.path.abspath('fake_source'),
+                        poll_min=args.poll_min, poll_max=args.poll_max)
+    start = time.time()
+    runs = [driver.start(f"fake_run_{i}", "../../fake.var", f"logs/fake_run_{i}.log") for i in range(args.runs)]
+    for run in runs:
+        run.wait()
+    driver.close()
+    logger.info(f"{args.runs} runs finished in {time.time() - start:.1f}s with {backend.calls.get('info', 0)} "
+                f"bob info queries; exit codes {[run.returncode for run in runs]}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+#!/bin/bash
+# Cancels the pnr/clock job of a CTS trial run so its grid slot is released.
+# Used by the optimizer when a trial is pruned while the job is still running.
+
+# --- ANSI Color Codes ---
+RED='\033[0;31m'
+BLUE='\033[0;34m'
+NC='\033[0m' # No Color
+
+log_info() { echo -e "${BLUE}[INFO]${NC} $1"; }
+log_err()  { echo -e "${RED}[ERROR]${NC} $1"; }
+
+# --- Argument Validation ---
+if [ "$#" -ne 2 ]; then
+  log_err "Missing arguments."
+  echo "Usage: $0 <run_name> <wa_name>"
+  exit 1
+fi
+
+RUN_NAME=$1
+WA_NAME=$2
+
+# --- Environment Setup ---
+module purge
+module load internal/bob linux/slurm > /dev/null 2>&1
+source /usr/local/google/gcpu/tools/altair/flowtracer/vov/2021.2.0/common/etc/vovrc.sh
+
+cd "$WA_NAME/run/" || exit 1
+
+log_info "Stopping job pnr/clock in run: $RUN_NAME"
+bob stop -r "$RUN_NAME" --node pnr/clock
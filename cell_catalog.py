@@ -0,0 +1,127 @@
+"""
+Cell Catalog
+Parses the usable buffer/inverter lists once into structured records (family, VT,
+drive strength, class) indexed by (class, VT) and sorted by drive strength, so a
+drive-range query is a bisect slice instead of a per-trial regex scan.
+"""
+
+import bisect
+import hashlib
+import logging
+import os
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Cell classes
+BUFFER = 'buffer'
+INVERTER = 'inverter'              # Standard INVD* logic inverters
+CLOCK_INVERTER = 'clock_inverter'  # Every other inverter (CKND*, DCCKND*, ...)
+
+# VT suffixes, longest first so 'ULVT' is never read as 'LVT'
+VT_SUFFIXES = sorted(['ULVTLL', 'ULVT', 'LVTLL', 'LVT', 'SVTLL', 'SVT', 'HVT', 'ELVT'], key=len, reverse=True)
+
+# Matches D1, D2, D0P5, etc.
+_DRIVE_PATTERN = re.compile(r'D(\d+P\d+|\d+)')
+_TRAILING_ALPHA = re.compile(r'[A-Z]+$')
+
+@dataclass(frozen=True)
+class CellInfo:
+    name: str
+    family: str
+    vt: str
+    drive: float
+    cell_class: str
+
+def parse_cell(name: str, cell_class: str) -> Optional[CellInfo]:
+    """Splits a library cell name into its fields. Returns None if it has no drive strength."""
+    match = _DRIVE_PATTERN.search(name)
+    if not match:
+        return None
+    vt = next((suffix for suffix in VT_SUFFIXES if name.endswith(suffix)), None)
+    if vt is None:
+        trailing = _TRAILING_ALPHA.search(name)
+        vt = trailing.group(0) if trailing else ''
+    return CellInfo(
+        name=name,
+        family=name[:match.start()],
+        vt=vt,
+        drive=float(match.group(1).replace('P', '.')),
+        cell_class=cell_class
+    )
+
+class CellCatalog:
+    def __init__(self, cells: List[CellInfo]):
+        self.cells_by_name: Dict[str, CellInfo] = {c.name: c for c in cells}
+        grouped: Dict[Tuple[str, str], List[CellInfo]] = {}
+        for cell in cells:
+            grouped.setdefault((cell.cell_class, cell.vt), []).append(cell)
+
+        # Parallel sorted arrays per (class, VT): drives for bisect, names for slicing
+        self._drives: Dict[Tuple[str, str], List[float]] = {}
+        self._names: Dict[Tuple[str, str], List[str]] = {}
+        for key, group in grouped.items():
+            group.sort(key=lambda c: (c.drive, c.name))
+            self._drives[key] = [c.drive for c in group]
+            self._names[key] = [c.name for c in group]
+
+    @classmethod
+    def from_lists(cls, buffers: List[str], inverters: List[str]) -> 'CellCatalog':
+        cells = []
+        skipped = 0
+        for names, classify in ((buffers, lambda n: BUFFER),
+                                (inverters, lambda n: INVERTER if n.startswith('INV') else CLOCK_INVERTER)):
+            for name in names:
+                info = parse_cell(name, classify(name))
+                if info is None:
+                    skipped += 1
+                else:
+                    cells.append(info)
+        if skipped:
+            logger.warning(f"Skipped {skipped} cells without a drive strength in their name.")
+        return cls(cells)
+
+    @classmethod
+    def load(cls, buffer_list_path: str, inverter_list_path: str) -> 'CellCatalog':
+        return cls.from_lists(load_cell_list(buffer_list_path), load_cell_list(inverter_list_path))
+
+    def __len__(self) -> int:
+        return len(self.cells_by_name)
+
+    def vts(self, cell_class: str) -> List[str]:
+        return sorted(vt for cls, vt in self._names if cls == cell_class)
+
+    def cells(self, cell_class: str, vt: str) -> List[str]:
+        """All cells of a class and VT, weakest drive first."""
+        return list(self._names.get((cell_class, vt), []))
+
+    def drives(self, cell_class: str, vt: str) -> List[float]:
+        """Distinct drive strengths available for a class and VT, ascending."""
+        return sorted(set(self._drives.get((cell_class, vt), [])))
+
+    def select(self, cell_class: str, vt: str, min_drive: float, max_drive: float) -> List[str]:
+        """Cells of a class and VT whose drive strength lies in [min_drive, max_drive]."""
+        key = (cell_class, vt)
+        drives = self._drives.get(key)
+        if not drives:
+            return []
+        lo = bisect.bisect_left(drives, min_drive)
+        hi = bisect.bisect_right(drives, max_drive)
+        return self._names[key][lo:hi]
+
+def cell_set_hash(base_var_content: str, inverters: List[str], buffers: List[str]) -> str:
+    """Content hash identifying a trial configuration: base var plus final cell lists."""
+    h = hashlib.sha256(base_var_content.encode())
+    for cells in (inverters, buffers):
+        h.update(b'\0' + " ".join(sorted(cells)).encode())
+    return h.hexdigest()[:16]
+
+def load_cell_list(filepath: str) -> List[str]:
+    """Loads a list of cells from a file, one cell per line. Missing files load as empty (with a warning)."""
+    if not os.path.exists(filepath):
+        logger.warning(f"File not found: {filepath}")
+        return []
+    with open(filepath, 'r') as f:
+        return [line.strip() for line in f if line.strip()]
@@ -0,0 +1,205 @@
+"""
+CTS Log Parser
+Single-pass extraction of every skew-group row from an Innovus clock.log or a
+report_ccopt_skew_groups report into a compact columnar SkewTable, which can be
+stored with the trial (user attributes / JSON sidecar) instead of re-reading logs.
+"""
+
+import bisect
+import json
+import mmap
+import os
+import re
+from array import array
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+# Rows used for the CTS objective: the ssgnp_ corners of the CLK/ skew groups
+DEFAULT_CORNER_PREFIX = 'ssgnp_'
+DEFAULT_GROUP_MARKER = 'CLK/'
+
+_NUM = rb'(-?\d+(?:\.\d+)?)'
+
+# Summary tables in clock.log start with this header; rows before the first one are table 0
+_TABLE_HEADER = b'Primary reporting skew groups summary'
+
+# Row patterns start at the ':' of the half-corner ("<delay corner>:setup.late") so the
+# regex engine can skip ahead on a literal; the delay-corner name is recovered by
+# scanning back to the preceding whitespace (see _corner_start).
+#
+# clock.log rows may carry timestamp/DEBUG prefixes.
+# Columns: Half-corner, Skew Group, Min ID, Max ID, Skew, ...
+_LOG_PATTERN = re.compile(
+    rb':((?:setup|hold)\.(?:early|late))[ \t]+(\S+)[ \t]+' + _NUM + rb'[ \t]+' + _NUM + rb'[ \t]+' + _NUM
+)
+
+# Skew-group report rows start at the beginning of a line.
+# Columns: Half-corner, Skew Group, ID Target, Min ID, Max ID, Avg ID, Std.Dev.,
+# Skew Target Type, Skew Target, Skew, ...
+_REPORT_PATTERN = re.compile(
+    rb':((?:setup|hold)\.(?:early|late))[ \t]+(\S+)[ \t]+\S+[ \t]+' + _NUM + rb'[ \t]+' + _NUM
+    + rb'(?:[ \t]+\S+){4}[ \t]+' + _NUM
+)
+
+class SkewRow(NamedTuple):
+    table: int
+    corner: str
+    group: str
+    min_id: float
+    max_id: float
+    skew: float
+
+    def is_target(self, corner_prefix: str = DEFAULT_CORNER_PREFIX, group_marker: str = DEFAULT_GROUP_MARKER) -> bool:
+        return self.corner.startswith(corner_prefix) and group_marker in self.group
+
+class SkewTable:
+    """
+    Columnar skew-group rows. Corner and group names are dictionary-encoded; the
+    numeric columns are float arrays. `table` counts the summary tables seen in
+    the log (0 = rows before the first summary header).
+    """
+    def __init__(self):
+        self.corner_names: List[str] = []
+        self.group_names: List[str] = []
+        self._corner_ids: Dict[str, int] = {}
+        self._group_ids: Dict[str, int] = {}
+        self.table = array('i')
+        self.corner = array('i')
+        self.group = array('i')
+        self.min_id = array('d')
+        self.max_id = array('d')
+        self.skew = array('d')
+
+    def __len__(self) -> int:
+        return len(self.skew)
+
+    def _intern(self, names: List[str], ids: Dict[str, int], name: str) -> int:
+        idx = ids.get(name)
+        if idx is None:
+            idx = ids[name] = len(names)
+            names.append(name)
+        return idx
+
+    def append(self, table: int, corner: str, group: str, min_id: float, max_id: float, skew: float):
+        self.table.append(table)
+        self.corner.append(self._intern(self.corner_names, self._corner_ids, corner))
+        self.group.append(self._intern(self.group_names, self._group_ids, group))
+        self.min_id.append(min_id)
+        self.max_id.append(max_id)
+        self.skew.append(skew)
+
+    def row(self, i: int) -> SkewRow:
+        return SkewRow(self.table[i], self.corner_names[self.corner[i]], self.group_names[self.group[i]],
+                       self.min_id[i], self.max_id[i], self.skew[i])
+
+    def rows(self) -> Iterator[SkewRow]:
+        return (self.row(i) for i in range(len(self)))
+
+    def worst(self, corner_prefix: str = DEFAULT_CORNER_PREFIX,
+              group_marker: str = DEFAULT_GROUP_MARKER) -> Optional[Tuple[float, float]]:
+        """(Max ID latency, skew) of the target row with the largest skew, across all tables."""
+        best = None
+        for row in self.rows():
+            if row.is_target(corner_prefix, group_marker) and (best is None or row.skew > best.skew):
+                best = row
+        return (best.max_id, best.skew) if best else None
+
+    def last_table(self) -> 'SkewTable':
+        """Rows of the final summary table (the post-CTS numbers)."""
+        result = SkewTable()
+        if len(self):
+            last = max(self.table)
+            for row in self.rows():
+                if row.table == last:
+                    result.append(*row)
+        return result
+
+    def to_dict(self) -> Dict[str, list]:
+        """JSON-serializable columnar form."""
+        return {
+            'corners': list(self.corner_names),
+            'groups': list(self.group_names),
+            'table': self.table.tolist(),
+            'corner': self.corner.tolist(),
+            'group': self.group.tolist(),
+            'min_id': self.min_id.tolist(),
+            'max_id': self.max_id.tolist(),
+            'skew': self.skew.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, list]) -> 'SkewTable':
+        result = cls()
+        corners, groups = data['corners'], data['groups']
+        for i in range(len(data['skew'])):
+            result.append(data['table'][i], corners[data['corner'][i]], groups[data['group'][i]],
+                          data['min_id'][i], data['max_id'][i], data['skew'][i])
+        return result
+
+    def save_json(self, path: str):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.to_dict(), f, separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load_json(cls, path: str) -> 'SkewTable':
+        with open(path, 'r') as f:
+            return cls.from_dict(json.load(f))
+
+# Longest delay-corner name searched for when scanning back from a half-corner's ':'
+_MAX_CORNER_LEN = 256
+
+def _corner_start(data, colon: int) -> int:
+    """Offset where the half-corner token ending at `colon` begins."""
+    lo = max(0, colon - _MAX_CORNER_LEN)
+    return max(data.rfind(b' ', lo, colon), data.rfind(b'\t', lo, colon), data.rfind(b'\n', lo, colon), lo - 1) + 1
+
+def _scan(path: str, pattern: 're.Pattern[bytes]', result: SkewTable, line_start_only: bool = False):
+    """
+    Runs `pattern` once over the memory-mapped file and appends every matching row to
+    `result`, numbering rows by the clock.log summary table they follow.
+    """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            headers = []
+            pos = data.find(_TABLE_HEADER)
+            while pos != -1:
+                headers.append(pos)
+                pos = data.find(_TABLE_HEADER, pos + 1)
+
+            for match in pattern.finditer(data):
+                start = _corner_start(data, match.start())
+                if start == match.start() or (line_start_only and start > 0 and data[start - 1:start] != b'\n'):
+                    continue
+                corner = (data[start:match.start()] + b':' + match.group(1)).decode()
+                result.append(bisect.bisect_left(headers, start), corner, match.group(2).decode(),
+                              float(match.group(3)), float(match.group(4)), float(match.group(5)))
+
+def parse_clock_log(path: str) -> SkewTable:
+    """Extracts every skew-group summary row from a clock.log. Raises FileNotFoundError."""
+    result = SkewTable()
+    _scan(path, _LOG_PATTERN, result)
+    return result
+
+def parse_log_line(line: Union[str, bytes], table: int = 0) -> Optional[SkewRow]:
+    """Parses one clock.log line (e.g. while tailing a running job) into a SkewRow."""
+    if isinstance(line, str):
+        line = line.encode()
+    match = _LOG_PATTERN.search(line)
+    if not match:
+        return None
+    start = _corner_start(line, match.start())
+    if start == match.start():
+        return None
+    corner = (line[start:match.start()] + b':' + match.group(1)).decode()
+    return SkewRow(table, corner, match.group(2).decode(),
+                   float(match.group(3)), float(match.group(4)), float(match.group(5)))
+
+def parse_skew_report(path: str) -> SkewTable:
+    """Extracts every row of a report_ccopt_skew_groups report. Raises FileNotFoundError."""
+    result = SkewTable()
+    _scan(path, _REPORT_PATTERN, result, line_start_only=True)
+    return result
@@ -0,0 +1,106 @@
+"""
+Fatal Pattern Watcher
+Streams a running trial's logs (clock.log and the flow's own log) and matches each new
+line against a table of fatal or known-bad patterns, so a job that has already failed
+(missing library, license checkout failure, rejected cell list, ...) can be killed as
+soon as the line appears instead of when Bob finally marks it FAILED.
+"""
+
+import json
+import os
+import re
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+
+# What happens to the trial on a match: 'fail' marks it FAIL (infrastructure or flow
+# problem, nothing learned about the parameters); 'prune' marks it PRUNED (the
+# parameters themselves are bad, e.g. Innovus rejected the cell list)
+PATTERN_ACTIONS = ('fail', 'prune')
+
+@dataclass(frozen=True)
+class FatalPattern:
+    name: str
+    pattern: str
+    action: str = 'fail'
+
+    def __post_init__(self):
+        if self.action not in PATTERN_ACTIONS:
+            raise ValueError(f"Pattern '{self.name}': unknown action '{self.action}', expected one of {PATTERN_ACTIONS}")
+
+@dataclass
+class FatalMatch:
+    pattern: FatalPattern
+    path: str
+    line: str
+
+DEFAULT_FATAL_PATTERNS = [
+    FatalPattern('license', r'(?i)(?:failed to check ?out|unable to obtain|no available) .*licen[sc]e'),
+    FatalPattern('missing_library', r'\*\*ERROR: \(IMPLF-\d+\)|(?i:cannot (?:find|open) (?:the )?(?:lef|lib(?:erty|rary)?) file)'),
+    FatalPattern('empty_cell_list',
+                 r'\*\*ERROR: \(IMPCCOPT-\d+\).*(?:buffer|inverter)_cells|set_ccopt_property.*(?:buffer|inverter)_cells.*(?:not found|invalid|empty)',
+                 'prune'),
+    FatalPattern('innovus_crash', r'(?i)segmentation fault|innovus terminated abnormally|\*\*ERROR: \(IMPSYT-\d+\)'),
+]
+
+# Built-in patterns that are off unless a pattern table enables them by name. Innovus
+# reports many recoverable Tcl errors (a stray get_db, a missing optional file) and the
+# flow carries on, so a TCLCMD error alone is not fatal.
+OPTIONAL_FATAL_PATTERNS = {
+    'tcl_error': FatalPattern('tcl_error', r'\*\*ERROR: \(TCLCMD-\d+\)'),
+}
+
+def load_fatal_patterns(path: str) -> List[FatalPattern]:
+    """
+    Reads a JSON list of {"name", "pattern", "action"} objects. Entries replace the
+    default pattern of the same name; new names are added, and an entry with
+    "pattern": null removes that default. An entry without a "pattern" key enables the
+    OPTIONAL_FATAL_PATTERNS entry of that name, e.g. {"name": "tcl_error"}.
+    """
+    with open(path) as f:
+        entries = json.load(f)
+    patterns = {p.name: p for p in DEFAULT_FATAL_PATTERNS}
+    for entry in entries:
+        if 'pattern' not in entry:
+            if entry['name'] not in OPTIONAL_FATAL_PATTERNS:
+                raise ValueError(f"Pattern '{entry['name']}' has no \"pattern\" and is not one of the optional "
+                                 f"built-in patterns {sorted(OPTIONAL_FATAL_PATTERNS)}")
+            optional = OPTIONAL_FATAL_PATTERNS[entry['name']]
+            patterns[optional.name] = FatalPattern(optional.name, optional.pattern, entry.get('action', optional.action))
+        elif entry['pattern'] is None:
+            patterns.pop(entry['name'], None)
+        else:
+            patterns[entry['name']] = FatalPattern(entry['name'], entry['pattern'], entry.get('action', 'fail'))
+    return list(patterns.values())
+
+class LogFollower:
+    """Incrementally reads the complete lines appended to a file since the last poll."""
+    def __init__(self, path: str, from_end: bool = False):
+        self.path = path
+        self.offset = os.path.getsize(path) if from_end and os.path.exists(path) else 0
+        self.partial = b''
+
+    def lines(self) -> List[bytes]:
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            chunk = f.read()
+            self.offset = f.tell()
+        lines = (self.partial + chunk).split(b'\n')
+        self.partial = lines.pop()
+        return lines
+
+class FatalPatternWatcher:
+    """Checks the new lines of each followed log against the pattern table."""
+    def __init__(self, patterns: Sequence[FatalPattern], followers: Sequence[LogFollower]):
+        self.patterns = [(p, re.compile(p.pattern.encode())) for p in patterns]
+        self.followers = list(followers)
+
+    def poll(self) -> Optional[FatalMatch]:
+        """The first match in the lines written since the last poll, if any."""
+        for follower in self.followers:
+            for line in follower.lines():
+                for pattern, regex in self.patterns:
+                    if regex.search(line):
+                        return FatalMatch(pattern, follower.path, line.decode(errors='replace').strip()[:500])
+        return None
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+Flow Scheduler
+Long-lived per-host daemon that the optimizer workers hand their trial runs to over a
+Unix socket (--flow-driver scheduler). The Bob environment is set up once for the
+host, `bob` submissions from all workers go through one rate limiter, every workspace
+gets a single FlowDriver (one batched status query for all of the host's runs), and
+completions are pushed back to the submitting worker instead of being polled for.
+"""
+
+import argparse
+import logging
+import os
+import queue
+import secrets
+import signal
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Connection, Listener
+from typing import Any, Dict, Optional, Tuple
+
+from bob_driver import EXIT_FAILED, BobBackend, CommandBackend, FakeBobBackend, FlowDriver, FlowRun
+
+# --- Logging Configuration ---
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s [%(levelname)s] %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOCKET = f"/tmp/flow_scheduler_{os.getuid()}.sock"
+# Shared secret of the daemon and its workers: both ends of every connection prove
+# they hold it before any (pickled) message is exchanged
+DEFAULT_KEY_FILE = os.path.expanduser("~/.flow_scheduler.key")
+
+# Fields of a FlowRun that travel back to the worker with its completion event
+RUN_TIMES = ('created_at', 'submitted_at', 'started_at', 'finished_at')
+
+def load_authkey(path: str = DEFAULT_KEY_FILE, create: bool = False) -> bytes:
+    """Reads the scheduler's key, creating it (mode 0600) first if `create` and it is missing."""
+    if create and not os.path.exists(path):
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            pass  # Created concurrently
+        else:
+            with os.fdopen(fd, 'w') as f:
+                f.write(secrets.token_hex(32))
+    if os.stat(path).st_mode & 0o077:
+        raise PermissionError(f"{path} must not be accessible by other users (chmod 600 {path})")
+    with open(path) as f:
+        return f.read().strip().encode()
+
+class SubmitLimiter:
+    """Token bucket: at most `burst` submissions at once, refilled at `rate_per_min`."""
+    def __init__(self, rate_per_min: float, burst: int):
+        self.rate = rate_per_min / 60.0
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+
+@dataclass
+class _Submission:
+    client: '_ClientSession'
+    workspace: Tuple[str, str, str]
+    kwargs: Dict[str, Any]
+
+class _ClientSession:
+    """One connected worker. Sends are serialized: replies and completion events share the socket."""
+    def __init__(self, conn: Connection, client_id: int):
+        self.conn = conn
+        self.client_id = client_id
+        self.runs: Dict[str, Tuple[FlowDriver, FlowRun]] = {}
+        self.cancelled: set = set()
+        self._send_lock = threading.Lock()
+
+    def send(self, message: Dict[str, Any]):
+        try:
+            with self._send_lock:
+                self.conn.send(message)
+        except (OSError, EOFError):
+            pass  # Worker went away; its runs keep going in Bob and can be resumed
+
+class FlowScheduler:
+    def __init__(self, backend: CommandBackend, socket_path: str = DEFAULT_SOCKET, submit_rate: float = 30.0,
+                 submit_burst: int = 5, submitters: int = 4, poll_min: float = 10, poll_max: float = 60,
+                 key_file: str = DEFAULT_KEY_FILE):
+        self.backend = backend
+        self.socket_path = socket_path
+        self.authkey = load_authkey(key_file, create=True)
+        self.limiter = SubmitLimiter(submit_rate, submit_burst)
+        self.poll_min = poll_min
+        self.poll_max = poll_max
+        self._drivers: Dict[Tuple[str, str, str], FlowDriver] = {}
+        self._drivers_lock = threading.Lock()
+        self._queue: 'queue.Queue[_Submission]' = queue.Queue()
+        for i in range(submitters):
+            threading.Thread(target=self._submit_loop, name=f"submitter-{i}", daemon=True).start()
+
+    def driver(self, workspace: Tuple[str, str, str]) -> FlowDriver:
+        """The shared FlowDriver of a (workspace, block, source dir)."""
+        with self._drivers_lock:
+            if workspace not in self._drivers:
+                wa_name, block_name, source_dir = workspace
+                self._drivers[workspace] = FlowDriver(self.backend, wa_name, block_name, source_dir,
+                                                      poll_min=self.poll_min, poll_max=self.poll_max)
+            return self._drivers[workspace]
+
+    def serve_forever(self):
+        if os.path.exists(self.socket_path):
+            if _socket_alive(self.socket_path):
+                raise RuntimeError(f"Another flow scheduler is already listening on {self.socket_path}")
+            os.remove(self.socket_path)  # Left by a daemon that died
+        # Messages are pickles: the socket is created 0600 and every peer must hold the key
+        umask = os.umask(0o077)
+        try:
+            listener = Listener(self.socket_path, family='AF_UNIX', authkey=self.authkey)
+        finally:
+            os.umask(umask)
+        logger.info(f"Flow scheduler listening on {self.socket_path}")
+        client_id = 0
+        try:
+            while True:
+                try:
+                    conn = listener.accept()
+                except (AuthenticationError, EOFError, OSError) as e:
+                    logger.warning(f"Rejected a connection: {type(e).__name__}: {e}")
+                    continue
+                client_id += 1
+                session = _ClientSession(conn, client_id)
+                threading.Thread(target=self._serve_client, args=(session,), name=f"client-{client_id}",
+                                 daemon=True).start()
+        finally:
+            listener.close()
+
+    def _serve_client(self, session: _ClientSession):
+        logger.info(f"Worker {session.client_id} connected")
+        while True:
+            try:
+                message = session.conn.recv()
+            except (EOFError, OSError):
+                break
+            op = message.get('op')
+            if op == 'start':
+                self._start(session, tuple(message['workspace']), message['kwargs'])
+            elif op == 'cancel':
+                self._cancel(session, message['run_name'])
+            else:
+                logger.warning(f"Worker {session.client_id}: unknown op {op!r}")
+        logger.info(f"Worker {session.client_id} disconnected ({len(session.runs)} runs still tracked)")
+
+    def _start(self, session: _ClientSession, workspace: Tuple[str, str, str], kwargs: Dict[str, Any]):
+        if kwargs.get('attach'):
+            # Nothing is submitted when attaching, so it bypasses the rate limit
+            self._launch(_Submission(session, workspace, kwargs))
+        else:
+            self._queue.put(_Submission(session, workspace, kwargs))
+
+    def _submit_loop(self):
+        while True:
+            submission = self._queue.get()
+            if submission.kwargs['run_name'] in submission.client.cancelled:
+                self._send_done(submission.client, submission.kwargs['run_name'], EXIT_FAILED, {})
+                continue
+            self.limiter.acquire()
+            self._launch(submission)
+
+    def _launch(self, submission: _Submission):
+        session, run_name = submission.client, submission.kwargs['run_name']
+        driver = self.driver(submission.workspace)
+        try:
+            run = driver.start(**submission.kwargs, on_done=lambda run: self._on_done(session, run))
+        except Exception as e:
+            logger.error(f"Could not start {run_name}: {type(e).__name__}: {e}")
+            self._send_done(session, run_name, EXIT_FAILED, {})
+            return
+        session.runs[run_name] = (driver, run)
+        if run.done.is_set():
+            session.runs.pop(run_name, None)
+        elif run_name in session.cancelled:
+            driver.cancel(run)  # Cancelled while it was being provisioned
+        logger.info(f"Worker {session.client_id}: started {run_name}")
+
+    def _cancel(self, session: _ClientSession, run_name: str):
+        session.cancelled.add(run_name)
+        tracked = session.runs.get(run_name)
+        if tracked is not None:
+            driver, run = tracked
+            driver.cancel(run)
+
+    def _on_done(self, session: _ClientSession, run: FlowRun):
+        session.runs.pop(run.run_name, None)
+        session.cancelled.discard(run.run_name)
+        self._send_done(session, run.run_name, run.returncode, {key: getattr(run, key) for key in RUN_TIMES})
+
+    @staticmethod
+    def _send_done(session: _ClientSession, run_name: str, returncode: int, times: Dict[str, Optional[float]]):
+        session.send({'event': 'done', 'run_name': run_name, 'returncode': returncode, **times})
+
+def _socket_alive(socket_path: str) -> bool:
+    """True if something is accepting connections on the socket."""
+    try:
+        Client(socket_path, family='AF_UNIX').close()
+    except (ConnectionRefusedError, FileNotFoundError):
+        return False
+    except (AuthenticationError, EOFError, OSError):
+        pass  # Listening, but not (or not only) for us
+    return True
+
+class SchedulerClient:
+    """
+    Worker side of the scheduler, with the FlowDriver interface (start / cancel /
+    FlowRun.wait), so CTSObjective can use either one.
+    """
+    def __init__(self, wa_name: str, block_name: str, source_dir: str, socket_path: str = DEFAULT_SOCKET,
+                 key_file: str = DEFAULT_KEY_FILE):
+        self.wa_name = os.path.abspath(wa_name)
+        self.workspace = (self.wa_name, block_name, source_dir)
+        self.conn = Client(socket_path, family='AF_UNIX', authkey=load_authkey(key_file))
+        self._runs: Dict[str, FlowRun] = {}
+        self._lock = threading.Lock()
+        threading.Thread(target=self._read_events, name="scheduler-events", daemon=True).start()
+
+    def start(self, run_name: str, var_file: str, log_path: str, attach: bool = False,
+              template_run: Optional[str] = None, template_var: Optional[str] = None,
+              overrides_tcl: Optional[str] = None) -> FlowRun:
+        """Hands a run to the scheduler. `var_file` is relative to WA/run, as for FlowDriver."""
+        log_path = os.path.abspath(log_path)
+        run = FlowRun(run_name, log_path, attach=attach)
+        kwargs = dict(run_name=run_name, var_file=os.path.abspath(os.path.join(self.wa_name, 'run', var_file)),
+                      log_path=log_path, attach=attach, template_run=template_run,
+                      template_var=template_var, overrides_tcl=overrides_tcl)
+        with self._lock:
+            self._runs[run_name] = run
+            self.conn.send({'op': 'start', 'workspace': self.workspace, 'kwargs': kwargs})
+        return run
+
+    def cancel(self, run: FlowRun):
+        with self._lock:
+            self.conn.send({'op': 'cancel', 'run_name': run.run_name})
+        run.done.wait()
+
+    def close(self):
+        self.conn.close()
+
+    def _read_events(self):
+        while True:
+            try:
+                event = self.conn.recv()
+            except (EOFError, OSError):
+                break
+            with self._lock:
+                run = self._runs.pop(event['run_name'], None)
+            if run is None:
+                continue
+            for key in RUN_TIMES:
+                if event.get(key) is not None:
+                    setattr(run, key, event[key])
+            run.returncode = event['returncode']
+            run.done.set()
+
+        # Connection lost: the runs may still finish in Bob, but nobody will report it
+        with self._lock:
+            orphaned, self._runs = list(self._runs.values()), {}
+        if orphaned:
+            logger.error(f"Lost the flow scheduler with {len(orphaned)} runs in flight.")
+        for run in orphaned:
+            run.returncode = EXIT_FAILED
+            run.done.set()
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-host flow scheduler shared by the optimizer workers")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help="Unix socket the workers connect to")
+    parser.add_argument("--key-file", default=DEFAULT_KEY_FILE,
+                        help="Secret shared with the workers (created 0600 if missing)")
+    parser.add_argument("--submit-rate", type=float, default=30.0, help="Max bob submissions per minute")
+    parser.add_argument("--submit-burst", type=int, default=5, help="Submissions allowed back to back")
+    parser.add_argument("--submitters", type=int, default=4, help="Threads provisioning/submitting runs")
+    parser.add_argument("--poll-min", type=float, default=10, help="Fastest status poll (s)")
+    parser.add_argument("--poll-max", type=float, default=60, help="Slowest status poll (s)")
+    parser.add_argument("--fake", action="store_true", help="Simulate Bob (local testing)")
+    args = parser.parse_args()
+
+    backend = FakeBobBackend() if args.fake else BobBackend()
+    scheduler = FlowScheduler(backend, args.socket, args.submit_rate, args.submit_burst, args.submitters,
+                              args.poll_min, args.poll_max, args.key_file)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        scheduler.serve_forever()  # Closing the listener removes the socket
+    except RuntimeError as e:
+        logger.error(str(e))
+        sys.exit(1)
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
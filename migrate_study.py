@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Study Migration
+Copies Optuna studies between storages (SQLite, Postgres or a journal file), or merges
+several studies into one. Params with their distributions, values, intermediate values
+and user/system attributes are kept. RDB destinations receive all trials through batched
+INSERTs in one transaction instead of one add_trial round trip per trial.
+
+The batched path writes Optuna's RDB tables directly, so it is only used on the schema
+revisions in BATCH_SCHEMA_VERSIONS; other destinations get one public create_new_trial
+call per trial. Like Optuna's own trial creation, it holds the destination study's row
+lock while numbering trials, so workers running on that study wait for the migration
+instead of reusing its trial numbers.
+"""
+
+import argparse
+import copy
+import datetime
+import json
+import logging
+import sys
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import optuna
+from optuna import distributions
+from optuna.trial import FrozenTrial, TrialState
+from sqlalchemy import bindparam, func, insert, select, update
+
+try:
+    from optuna.storages._rdb import models
+except ImportError:  # Private module; the batched path is skipped without it
+    models = None
+
+from storage_utils import open_storage
+
+# --- Logging Configuration ---
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s [%(levelname)s] %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+logger = logging.getLogger(__name__)
+
+FINISHED_STATES = (TrialState.COMPLETE, TrialState.PRUNED, TrialState.FAIL)
+
+# RDB schema revisions (RDBStorage.get_current_version) whose tables _insert_rdb writes
+# directly: the current one since Optuna 3.2. Add a revision here only after checking
+# _insert_rdb against its models.
+BATCH_SCHEMA_VERSIONS = ('v3.2.0.a',)
+
+def _stored_datetime(value: Optional[datetime.datetime]) -> Optional[datetime.datetime]:
+    """A trial datetime as the trials table stores it: naive UTC in newer Optuna, naive local time before."""
+    if value is None or not hasattr(models.TrialModel, '_datetime_start_utc'):
+        return value
+    return value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+def _insert_rdb(storage: optuna.storages.RDBStorage, study_id: int, trials: Sequence[FrozenTrial],
+                extra_attrs: List[Dict[str, Any]]):
+    """
+    Writes trials with one executemany INSERT per table in a single transaction: the
+    trial rows first (unnumbered, as Optuna inserts them), then their new ids are read
+    back and numbered after the study's earlier trials, and the params, values,
+    intermediate values and attributes tables are filled.
+
+    The study row is locked FOR UPDATE first, the lock Optuna takes to number a new
+    trial, so concurrent workers block until the commit (SQLite serializes writers
+    from the first INSERT instead).
+    """
+    session = storage.scoped_session()
+    try:
+        session.execute(
+            select(models.StudyModel.study_id).where(models.StudyModel.study_id == study_id).with_for_update()
+        )
+        session.execute(insert(models.TrialModel.__table__), [{
+            'study_id': study_id,
+            'number': None,
+            'state': trial.state,
+            'datetime_start': _stored_datetime(trial.datetime_start),
+            'datetime_complete': _stored_datetime(trial.datetime_complete),
+        } for trial in trials])
+        new_ids = session.execute(
+            select(models.TrialModel.trial_id)
+            .where(models.TrialModel.study_id == study_id, models.TrialModel.number.is_(None))
+            .order_by(models.TrialModel.trial_id)
+        ).scalars().all()
+        if len(new_ids) != len(trials):
+            raise RuntimeError(f"Expected {len(trials)} new unnumbered trials in study {study_id}, "
+                               f"found {len(new_ids)}")
+        # Optuna numbers a trial by the study's trials with a lower id (TrialModel.count_past_trials)
+        first_number = session.execute(
+            select(func.count(models.TrialModel.trial_id))
+            .where(models.TrialModel.study_id == study_id, models.TrialModel.trial_id < new_ids[0])
+        ).scalar()
+        trial_ids = {first_number + i: trial_id for i, trial_id in enumerate(new_ids)}
+        session.execute(
+            update(models.TrialModel.__table__)
+            .where(models.TrialModel.__table__.c.trial_id == bindparam('b_trial_id'))
+            .values(number=bindparam('b_number')),
+            [{'b_trial_id': trial_id, 'b_number': number} for number, trial_id in trial_ids.items()]
+        )
+
+        rows: Dict[type, List[Dict[str, Any]]] = {
+            models.TrialParamModel: [],
+            models.TrialValueModel: [],
+            models.TrialIntermediateValueModel: [],
+            models.TrialUserAttributeModel: [],
+            models.TrialSystemAttributeModel: [],
+        }
+        for i, (trial, extra) in enumerate(zip(trials, extra_attrs)):
+            trial_id = trial_ids[first_number + i]
+            for name, value in trial.params.items():
+                dist = trial.distributions[name]
+                rows[models.TrialParamModel].append({
+                    'trial_id': trial_id, 'param_name': name, 'param_value': dist.to_internal_repr(value),
+                    'distribution_json': distributions.distribution_to_json(dist)
+                })
+            for objective, value in enumerate(trial.values or []):
+                stored, value_type = models.TrialValueModel.value_to_stored_repr(value)
+                rows[models.TrialValueModel].append({
+                    'trial_id': trial_id, 'objective': objective, 'value': stored, 'value_type': value_type
+                })
+            for step, value in trial.intermediate_values.items():
+                stored, value_type = models.TrialIntermediateValueModel.intermediate_value_to_stored_repr(value)
+                rows[models.TrialIntermediateValueModel].append({
+                    'trial_id': trial_id, 'step': step, 'intermediate_value': stored,
+                    'intermediate_value_type': value_type
+                })
+            for key, value in {**trial.user_attrs, **extra}.items():
+                rows[models.TrialUserAttributeModel].append({'trial_id': trial_id, 'key': key, 'value_json': json.dumps(value)})
+            for key, value in trial.system_attrs.items():
+                rows[models.TrialSystemAttributeModel].append({'trial_id': trial_id, 'key': key, 'value_json': json.dumps(value)})
+
+        for model, table_rows in rows.items():
+            if table_rows:
+                session.execute(insert(model.__table__), table_rows)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+def batch_supported(storage: optuna.storages.BaseStorage) -> bool:
+    """True if `storage` is an RDB storage on a schema revision _insert_rdb was written for."""
+    if models is None or not isinstance(storage, optuna.storages.RDBStorage):
+        return False
+    version = storage.get_current_version()
+    if version not in BATCH_SCHEMA_VERSIONS:
+        logger.warning(f"RDB schema {version} is not one of {BATCH_SCHEMA_VERSIONS}; "
+                       f"copying trials one at a time through the storage API")
+        return False
+    return True
+
+def insert_trials(storage: optuna.storages.BaseStorage, study_id: int, trials: Sequence[FrozenTrial],
+                  extra_attrs: Optional[List[Dict[str, Any]]] = None):
+    """
+    Appends `trials` to a study, numbered after its existing trials, adding
+    `extra_attrs[i]` to the user attributes of trial i. RDB storages on a known schema
+    get batched INSERTs in one transaction; other storages fall back to one
+    create_new_trial per trial, which also keeps the trial datetimes.
+    """
+    extra_attrs = extra_attrs or [{} for _ in trials]
+    if not trials:
+        return
+    if batch_supported(storage):
+        _insert_rdb(storage, study_id, trials, extra_attrs)
+        return
+    for trial, extra in zip(trials, extra_attrs):
+        if extra:
+            trial = copy.copy(trial)
+            trial.user_attrs = {**trial.user_attrs, **extra}
+        storage.create_new_trial(study_id, template_trial=trial)
+
+def migrate(source: optuna.storages.BaseStorage, dest: optuna.storages.BaseStorage,
+            study_names: Sequence[str], into: Optional[str] = None, include_running: bool = False) -> int:
+    """
+    Copies each study in `study_names` to `dest` under its own name, or merges them all
+    into the study `into` (created if missing). Merged trials are tagged with
+    `source_study` / `source_trial_number` user attributes. Returns the trials written.
+    """
+    states = None if include_running else FINISHED_STATES
+    written = 0
+    for name in study_names:
+        src_id = source.get_study_id_from_name(name)
+        directions = source.get_study_directions(src_id)
+        trials = source.get_all_trials(src_id, deepcopy=False, states=states)
+        target_name = into or name
+
+        try:
+            study_id = dest.get_study_id_from_name(target_name)
+        except KeyError:
+            study_id = dest.create_new_study(directions, target_name)
+        else:
+            if into is None:
+                raise ValueError(f"Study '{target_name}' already exists in the destination; use --into to merge.")
+            if dest.get_study_directions(study_id) != directions:
+                raise ValueError(f"Cannot merge '{name}' into '{target_name}': objective directions differ.")
+
+        for key, value in source.get_study_user_attrs(src_id).items():
+            dest.set_study_user_attr(study_id, key, value)
+        for key, value in source.get_study_system_attrs(src_id).items():
+            dest.set_study_system_attr(study_id, key, value)
+
+        extra = [{'source_study': name, 'source_trial_number': t.number} for t in trials] if into else None
+        start = time.perf_counter()
+        insert_trials(dest, study_id, trials, extra)
+        elapsed = time.perf_counter() - start
+        logger.info(f"{'Merged' if into else 'Copied'} {len(trials)} trials of '{name}' into '{target_name}' "
+                    f"in {elapsed:.2f}s")
+        written += len(trials)
+    return written
+
+def main():
+    parser = argparse.ArgumentParser(description="Copy or merge Optuna studies between storages")
+    parser.add_argument("source", help="Source storage URL (sqlite:///..., postgresql://...) or journal file")
+    parser.add_argument("dest", help="Destination storage URL or journal file")
+    parser.add_argument("--study", nargs="+", help="Studies to migrate (default: all studies in the source)")
+    parser.add_argument("--into", help="Merge every selected study into this destination study")
+    parser.add_argument("--include-running", action="store_true",
+                        help="Also copy RUNNING/WAITING trials (skipped by default)")
+    args = parser.parse_args()
+
+    source = open_storage(args.source)
+    dest = open_storage(args.dest)
+    study_names = args.study or optuna.study.get_all_study_names(source)
+    if not study_names:
+        logger.error("No studies found in the source storage.")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    try:
+        written = migrate(source, dest, study_names, args.into, args.include_running)
+    except (KeyError, ValueError) as e:
+        logger.error(str(e))
+        sys.exit(1)
+    logger.info(f"Done: {written} trials from {len(study_names)} studies in {time.perf_counter() - start:.1f}s")
+
+if __name__ == "__main__":
+    main()
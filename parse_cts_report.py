@@ -1,27 +1,22 @@
-import re
 import sys
 
+import cts_log_parser
+
 def parse_skew_report(file_path):
     """
     Parses a Cadence Innovus skew report to find the Max Latency (Max ID)
     and Skew for the primary setup.late timing corner.
     """
     try:
-        with open(file_path, 'r') as f:
-            content = f.read()
-
-        # This regex is built to find the 'ssgnp...setup.late' line and
-        # capture the 5th and 10th columns of data.
-        pattern = re.compile(
-            r"^ssgnp_.*:setup\.late\s+\S+\s+\S+\s+\S+\s+(\d+\.\d+)\s+\S+\s+\S+\s+\S+\s+\S+\s+(\d+\.\d+)",
-            re.MULTILINE
-        )
+        table = cts_log_parser.parse_skew_report(file_path)
 
-        match = pattern.search(content)
+        # The 'ssgnp...setup.late' row: Max ID (5th column) and Skew (10th column).
+        match = next((row for row in table.rows()
+                      if row.corner.startswith('ssgnp_') and row.corner.endswith(':setup.late')), None)
 
         if match:
-            max_latency = float(match.group(1))
-            skew = float(match.group(2))
+            max_latency = match.max_id
+            skew = match.skew
             
             print(f"Successfully parsed report: {file_path}")
             print(f"  Max Latency (Max ID): {max_latency} ns")
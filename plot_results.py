@@ -1,96 +1,148 @@
 import optuna
 import pandas as pd
 import matplotlib.pyplot as plt
+import json
 import os
 import urllib.parse
+from concurrent.futures import ProcessPoolExecutor
+
+import cts_log_parser
+from storage_utils import open_storage
 
 # ==========================================
 # CONFIGURATION
 # ==========================================
 
 
+# RDB URL, or the path of a journal file (--db-type journal)
 STORAGE_URL = "sqlite:///gcpu_lcu_v5_study.db"
 STUDY_NAME = "gcpu_lcu_v5"
+# Run names of trials that have no recorded `run_name` user attribute (older studies)
+# are assumed to be <RUN_PREFIX>_trial_<number>
+RUN_PREFIX = "gcpu_lcu_v5"
 
 # Directory containing your trial logs
 LOGS_BASE_DIR = "/google/gchips/workspace/sycamore/cbf/user/tianenc/lcu_optimizer/optuna_cts/lcu/run"
 LOG_FILENAME = "clock.log"
+# Per-run skew-group sidecars (<run_name>.skew.json) written by the optimizer and by
+# workspace_gc.py before it archives a run; used when a run's clock.log is gone
+RESULTS_DIR = "results"
+
+# Where per-trial latency/skew come from:
+#   "attrs" - only the trial user attributes recorded by the optimizer (no filesystem access)
+#   "logs"  - only re-parsing each trial's clock.log
+#   "auto"  - user attributes, falling back to logs for trials that lack them
+METRICS_SOURCE = "auto"
+
+# Parsed (latency, skew) per log, keyed on path and invalidated by mtime/size,
+# so re-plots only parse new or changed logs
+METRICS_CACHE_FILE = f"{STUDY_NAME}_metrics_cache.json"
+# Parallel log readers (processes, so NFS reads and parsing overlap)
+HARVEST_WORKERS = 16
 
 # ==========================================
 
 def get_optuna_data(db_url, study_name):
     """
-    Connects to the Optuna database and extracts the trial numbers and objective values.
-    Returns a dictionary: {trial_number: objective_value}
+    Connects to the Optuna database and extracts the trial numbers, objective values
+    and the latency/skew and run_name user attributes recorded by the optimizer, in one
+    query. Returns three dictionaries: {trial_number: objective_value},
+    {trial_number: (latency, skew)}, {trial_number: run_name}
     """
     print(f"Connecting to Optuna study '{study_name}'...")
     try:
-        study = optuna.load_study(study_name=study_name, storage=db_url)
+        study = optuna.load_study(study_name=study_name, storage=open_storage(db_url))
         # Get dataframe with only the necessary attributes to save memory
-        df = study.trials_dataframe(attrs=('number', 'value', 'state'))
+        df = study.trials_dataframe(attrs=('number', 'value', 'state', 'user_attrs'))
         
         # Filter for only COMPLETE trials to avoid plotting failed/pruned ones
         df_complete = df[df['state'] == 'COMPLETE']
         
         # Create a dictionary mapping trial number to its objective score
         scores_dict = dict(zip(df_complete['number'], df_complete['value']))
-        print(f"Successfully loaded {len(scores_dict)} completed trials from database.")
-        return scores_dict
+
+        metrics_dict = {}
+        if 'user_attrs_latency' in df_complete and 'user_attrs_skew' in df_complete:
+            for number, latency, skew in zip(df_complete['number'], df_complete['user_attrs_latency'],
+                                             df_complete['user_attrs_skew']):
+                if pd.notna(latency) and pd.notna(skew):
+                    metrics_dict[number] = (float(latency), float(skew))
+        run_names = {number: f"{RUN_PREFIX}_trial_{number}" for number in df_complete['number']}
+        if 'user_attrs_run_name' in df_complete:
+            for number, run_name in zip(df_complete['number'], df_complete['user_attrs_run_name']):
+                if pd.notna(run_name):
+                    run_names[number] = run_name
+        print(f"Successfully loaded {len(scores_dict)} completed trials from database "
+              f"({len(metrics_dict)} with recorded latency/skew).")
+        return scores_dict, metrics_dict, run_names
         
     except Exception as e:
         print(f"Database connection error: {e}")
         print("Please ensure your DB parameters are correct and the PostgreSQL server is reachable.")
+        return {}, {}, {}
+
+def load_metrics_cache(path):
+    """Returns {log_path: {"mtime", "size", "result"}} from a previous run, or {}."""
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
         return {}
 
-def parse_clock_log(filepath):
+def save_metrics_cache(path, cache):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(cache, f)
+    os.replace(tmp_path, path)
+
+def _harvest_one(log_path, cached):
     """
-    Parses a single clock.log file to extract Max ID (Latency) and Skew.
-    Tracks the maximum skew found to avoid grabbing 'early' corners or minor groups.
-    Returns a tuple (max_latency, skew) or None if not found.
+    Stats and (if new or changed) parses one log in a worker process.
+    Returns a cache entry, or None when the log does not exist.
     """
-    max_skew_found = -1.0
-    associated_latency = -1.0
-    found_valid_data = False
-    
     try:
-        with open(filepath, 'r') as f:
-            for line in f:
-                # Identify the row by checking for key identifiers
-                if "ssgnp_" in line and "CLK/" in line:
-                    parts = line.split()
-                    try:
-                        # Find exactly where the data starts to handle timestamps robustly
-                        base_idx = next(i for i, part in enumerate(parts) if part.startswith("ssgnp_"))
-                        
-                        # base_idx + 0 = Half-corner
-                        # base_idx + 1 = Skew Group
-                        # base_idx + 2 = Min ID
-                        # base_idx + 3 = Max ID (Latency)
-                        # base_idx + 4 = Skew
-                        
-                        max_latency = float(parts[base_idx + 3])
-                        skew = float(parts[base_idx + 4])
-                        
-                        # Keep the maximum skew found across all corners/groups
-                        if skew > max_skew_found:
-                            max_skew_found = skew
-                            associated_latency = max_latency
-                            found_valid_data = True
-                            
-                    except (IndexError, ValueError, StopIteration):
-                        continue
-                        
-        if found_valid_data:
-            return associated_latency, max_skew_found
-            
-    except Exception as e:
-        print(f"  [!] Error reading {filepath}: {e}")
-        
-    return None
+        st = os.stat(log_path)
+    except OSError:
+        return None
+    if cached and cached['mtime'] == st.st_mtime and cached['size'] == st.st_size:
+        return cached
+    try:
+        result = cts_log_parser.parse_clock_log(log_path).worst()
+    except (OSError, ValueError):
+        return None
+    return {'mtime': st.st_mtime, 'size': st.st_size, 'result': list(result) if result else None}
+
+def load_sidecar_metrics(run_name):
+    """(latency, skew) from a run's skew sidecar, or None."""
+    path = os.path.join(RESULTS_DIR, f"{run_name}.skew.json")
+    if not os.path.exists(path):
+        return None
+    return cts_log_parser.SkewTable.load_json(path).worst()
+
+def harvest_logs(log_paths, cache, workers=HARVEST_WORKERS):
+    """
+    Collects (latency, skew) for every log path across a process pool, reusing cache
+    entries whose mtime and size are unchanged. Updates `cache` in place and returns
+    {log_path: cache entry or None if missing}.
+    """
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        entries = pool.map(_harvest_one, log_paths, [cache.get(p) for p in log_paths], chunksize=8)
+        results = dict(zip(log_paths, entries))
+    reparsed = 0
+    for log_path, entry in results.items():
+        if entry is None:
+            cache.pop(log_path, None)
+        elif cache.get(log_path) != entry:
+            cache[log_path] = entry
+            reparsed += 1
+    print(f"  Parsed {reparsed} new/changed logs, {len(log_paths) - reparsed} from cache or missing.")
+    return results
 
 def main():
     # 1. Fetch Objective Scores from DB
-    optuna_scores = get_optuna_data(STORAGE_URL, STUDY_NAME)
+    optuna_scores, recorded_metrics, trial_run_names = get_optuna_data(STORAGE_URL, STUDY_NAME)
+    if METRICS_SOURCE == "logs":
+        recorded_metrics = {}
     if not optuna_scores:
         return
         
@@ -103,26 +155,63 @@ def main():
     plot_latencies = []
     plot_skews = []
     
-    print("\nScanning log files...")
-    # 2. Extract Data from Log Files
+    # 2. Extract Data from the recorded trial attributes, then Log Files for the rest
     for trial_num in trials:
-        # Formulate the path to match the specified directory structure
-        trial_folder = f"gcpu_lcu_v5_trial_{trial_num}"
-        log_path = os.path.join(LOGS_BASE_DIR, trial_folder, "main", "pnr", "clock", "logs", LOG_FILENAME)
-        
-        if os.path.exists(log_path):
-            log_data = parse_clock_log(log_path)
-            if log_data:
-                latency, skew = log_data
-                plot_trials.append(trial_num)
-                plot_obj_scores.append(optuna_scores[trial_num])
-                plot_latencies.append(latency)
-                plot_skews.append(skew)
-                print(f"  Trial {trial_num}: Extracted Max Latency = {latency}, Skew = {skew}")
+        if trial_num in recorded_metrics:
+            latency, skew = recorded_metrics[trial_num]
+            plot_trials.append(trial_num)
+            plot_obj_scores.append(optuna_scores[trial_num])
+            plot_latencies.append(latency)
+            plot_skews.append(skew)
+    if recorded_metrics:
+        print(f"\nUsing recorded latency/skew for {len(plot_trials)} trials.")
+
+    missing = [t for t in trials if t not in recorded_metrics]
+    if missing and METRICS_SOURCE == "attrs":
+        print(f"  [!] {len(missing)} trials have no recorded latency/skew; skipping them.")
+    elif missing:
+        print("\nScanning log files...")
+        # Formulate the paths to match the specified directory structure
+        log_paths = {
+            trial_num: os.path.join(LOGS_BASE_DIR, trial_run_names[trial_num], "main", "pnr", "clock", "logs", LOG_FILENAME)
+            for trial_num in missing
+        }
+        cache = load_metrics_cache(METRICS_CACHE_FILE)
+        harvested = harvest_logs(list(log_paths.values()), cache)
+        save_metrics_cache(METRICS_CACHE_FILE, cache)
+
+        for trial_num in missing:
+            log_path = log_paths[trial_num]
+            entry = harvested[log_path]
+            
+            if entry is not None:
+                if entry['result']:
+                    latency, skew = entry['result']
+                    plot_trials.append(trial_num)
+                    plot_obj_scores.append(optuna_scores[trial_num])
+                    plot_latencies.append(latency)
+                    plot_skews.append(skew)
+                    print(f"  Trial {trial_num}: Extracted Max Latency = {latency}, Skew = {skew}")
+                else:
+                    print(f"  [!] Log parsed but no valid skew/latency data found in: {log_path}")
             else:
-                print(f"  [!] Log parsed but no valid skew/latency data found in: {log_path}")
-        else:
-            print(f"  [!] Log file not found: {log_path}")
+                sidecar = load_sidecar_metrics(trial_run_names[trial_num])
+                if sidecar is not None:
+                    latency, skew = sidecar
+                    plot_trials.append(trial_num)
+                    plot_obj_scores.append(optuna_scores[trial_num])
+                    plot_latencies.append(latency)
+                    plot_skews.append(skew)
+                    print(f"  Trial {trial_num}: Max Latency = {latency}, Skew = {skew} (from skew sidecar)")
+                else:
+                    print(f"  [!] Log file not found: {log_path}")
+
+        # Keep the plot ordered by trial number when both sources contributed
+        order = sorted(range(len(plot_trials)), key=lambda i: plot_trials[i])
+        plot_trials = [plot_trials[i] for i in order]
+        plot_obj_scores = [plot_obj_scores[i] for i in order]
+        plot_latencies = [plot_latencies[i] for i in order]
+        plot_skews = [plot_skews[i] for i in order]
 
     if not plot_trials:
         print("\nNo overlapping data found between Optuna DB and log files. Cannot generate plot.")
@@ -1,6 +1,10 @@
 #!/bin/bash
 # Consolidated Flow Execution Script for CTS Trials
 # Handles workspace setup via symlinks and submits Bob jobs.
+# With ATTACH_ONLY=1 it skips create/link/submit and only polls an existing run
+# (used when a retried trial re-attaches to the Bob run of a dead worker).
+# With PROVISION_MODE=clone (plus TEMPLATE_RUN, TEMPLATE_VAR, OVERRIDES_TCL) runs are
+# copied from a template run that is created and validated once.
 
 # --- ANSI Color Codes ---
 RED='\033[0;31m'
@@ -13,6 +17,8 @@ log_info() { echo -e "${BLUE}[INFO]${NC} $1"; }
 log_warn() { echo -e "${YELLOW}[WARN]${NC} $1"; }
 log_err()  { echo -e "${RED}[ERROR]${NC} $1"; }
 log_succ() { echo -e "${GREEN}[SUCCESS]${NC} $1"; }
+# Timestamps read back by the optimizer to split the trial into phases
+mark_phase() { echo "PHASE_MARK $1 $(date +%s.%N)"; }
 
 # --- Argument Validation ---
 if [ "$#" -ne 5 ]; then
@@ -40,62 +46,203 @@ fi
 
 cd "$WA_NAME/run/" || exit
 
-# --- Create Bob Run ---
-log_info "Creating Bob run: $RUN_NAME"
-bob create -s pnr --var "$VAR_FILE" --run_dir "$RUN_NAME" --block "$BLOCK_NAME" --verbose info
+PREREQ_NODES="pnr/libgen pnr/setup pnr/floorplan pnr/placeopt"
 
-# --- Symbolic Link Logic ---
-PNR_SOURCE="${SOURCE_DIR_BASE}/pnr"
-PNR_DEST="${RUN_NAME}/main/pnr"
-DIRS_TO_LINK_PNR=( "setup" "placeopt" "libgen" "floorplan" )
+# Exit codes reported back to the optimizer
+EXIT_VALID=0
+EXIT_FAILED=1
+EXIT_INVALID=2
+EXIT_NOT_FOUND=3
 
-log_info "Linking PNR prerequisites..."
-for dir in "${DIRS_TO_LINK_PNR[@]}"; do
-  rm -rf "${PNR_DEST}/${dir}"
-  ln -s "${PNR_SOURCE}/${dir}" "${PN_DEST}/${dir}"
-done
+finish() {
+  echo "FLOW_STATUS: $1"
+  exit "$2"
+}
 
-log_info "Linking SYN prerequisites..."
-ln -sfv "${SOURCE_DIR_BASE}/syn" "${RUN_NAME}/main/syn" > /dev/null
+clock_status() {
+  bob info -r "$RUN_NAME" -O '@JOBNAME@ @STATUS@' | grep "pnr/clock" | awk '{print $2}' | tr -d '[:space:]'
+}
 
-# --- Execution & Polling ---
-log_info "Force-validating upstream nodes..."
-PREREQ_NODES="pnr/libgen pnr/setup pnr/floorplan pnr/placeopt"
-bob update status -f -i -b "$BLOCK_NAME" -r "$RUN_NAME" --force_validate $PREREQ_NODES
+# --- Provisioning ---
+# Creates a Bob run, replaces its prerequisite stages with links to the reference
+# run and force-validates them: $1 = run dir, $2 = var file. Returns non-zero if
+# any step fails.
+create_run() {
+  local run=$1
+  local var=$2
+  log_info "Creating Bob run: $run"
+  if ! bob create -s pnr --var "$var" --run_dir "$run" --block "$BLOCK_NAME" --verbose info; then
+    log_err "bob create failed for $run."
+    return 1
+  fi
+
+  local pnr_source="${SOURCE_DIR_BASE}/pnr"
+  local pnr_dest="${run}/main/pnr"
+  local dirs_to_link_pnr=( "setup" "placeopt" "libgen" "floorplan" )
+
+  log_info "Linking PNR prerequisites..."
+  for dir in "${dirs_to_link_pnr[@]}"; do
+    rm -rf "${pnr_dest}/${dir}"
+    ln -s "${pnr_source}/${dir}" "${pnr_dest}/${dir}" || return 1
+  done
+
+  log_info "Linking SYN prerequisites..."
+  ln -sfv "${SOURCE_DIR_BASE}/syn" "${run}/main/syn" > /dev/null || return 1
+
+  log_info "Force-validating upstream nodes..."
+  if ! bob update status -f -i -b "$BLOCK_NAME" -r "$run" --force_validate $PREREQ_NODES; then
+    log_err "bob update failed for $run."
+    return 1
+  fi
+}
+
+# PROVISION_MODE=clone: the first trial builds TEMPLATE_RUN (from TEMPLATE_VAR, whose
+# clock callback sources optuna_overrides.tcl from the clock node directory) under a
+# lock; every trial run is then a copy of it (reflinks where the filesystem supports
+# them; the prerequisite stages are symlinks either way) with the trial's
+# OVERRIDES_TCL dropped into its clock node directory. The template is only marked
+# ready once create_run succeeded; a failed build is removed so the next trial
+# builds it again instead of cloning a broken template.
+ensure_template() {
+  (
+    flock 9
+    if [ ! -f "${TEMPLATE_RUN}/.optuna_template_ready" ]; then
+      rm -rf "$TEMPLATE_RUN"
+      if ! create_run "$TEMPLATE_RUN" "$TEMPLATE_VAR"; then
+        rm -rf "$TEMPLATE_RUN"
+        exit 1
+      fi
+      touch "${TEMPLATE_RUN}/.optuna_template_ready"
+    fi
+  ) 9> ".${TEMPLATE_RUN}.lock"
+}
+
+clone_run() {
+  if ! ensure_template || [ ! -f "${TEMPLATE_RUN}/.optuna_template_ready" ]; then
+    log_err "Template run $TEMPLATE_RUN could not be created."
+    return 1
+  fi
+  log_info "Cloning $TEMPLATE_RUN -> $RUN_NAME"
+  rm -rf "$RUN_NAME"
+  cp -a --reflink=auto "$TEMPLATE_RUN" "$RUN_NAME" || return 1
+  rm -f "${RUN_NAME}/.optuna_template_ready"
+  mkdir -p "${RUN_NAME}/main/pnr/clock"
+  cp "$OVERRIDES_TCL" "${RUN_NAME}/main/pnr/clock/optuna_overrides.tcl" || return 1
 
-log_info "Submitting job: pnr/clock"
-bob run -r "$RUN_NAME" --node pnr/clock
+  # The copied prerequisites should already be VALID; only re-validate if Bob disagrees
+  local not_valid
+  not_valid=$(bob info -r "$RUN_NAME" -O '@JOBNAME@ @STATUS@' | grep -E "pnr/(libgen|setup|floorplan|placeopt) " | awk '$2 != "VALID"')
+  if [ -n "$not_valid" ]; then
+    log_warn "Cloned prerequisites not VALID; force-validating..."
+    if ! bob update status -f -i -b "$BLOCK_NAME" -r "$RUN_NAME" --force_validate $PREREQ_NODES; then
+      log_err "bob update failed for $RUN_NAME."
+      return 1
+    fi
+  fi
+}
+
+if [ "${ATTACH_ONLY:-0}" = "1" ]; then
+  log_info "Attaching to existing Bob run: $RUN_NAME"
+  if [ ! -d "$RUN_NAME" ] || [ -z "$(clock_status)" ]; then
+    log_err "No pnr/clock job found for run $RUN_NAME."
+    finish NOT_FOUND $EXIT_NOT_FOUND
+  fi
+else
+  if [ "${PROVISION_MODE:-create}" = "clone" ]; then
+    clone_run
+  else
+    create_run "$RUN_NAME" "$VAR_FILE"
+  fi
+  provisioned=$?
+
+  if [ "$provisioned" -eq 0 ]; then
+    log_info "Submitting job: pnr/clock"
+    bob run -r "$RUN_NAME" --node pnr/clock
+    provisioned=$?
+  fi
+  if [ "$provisioned" -ne 0 ]; then
+    # A partial run must not be attached to or resubmitted later
+    log_err "Provisioning $RUN_NAME failed; removing the partial run."
+    rm -rf "$RUN_NAME"
+    finish FAILED $EXIT_FAILED
+  fi
+  mark_phase submitted
+fi
 
 # Polling Loop
+# clock.log is written on the grid host, usually over NFS, where inotify on this
+# host sees nothing. Its mtime and size are stat'ed every POLL_MIN seconds instead
+# (cheap, no Bob server load) and the status is re-checked as soon as they change;
+# otherwise on an adaptive interval that starts at POLL_MIN and doubles up to
+# POLL_MAX while the status stays unchanged. POLL_MAX stays short because the final
+# status change itself writes nothing to clock.log.
 MAX_RETRIES=5
 RETRY_COUNT=0
+POLL_MIN=${POLL_MIN:-10}
+POLL_MAX=${POLL_MAX:-60}
+CLOCK_LOG="${RUN_NAME}/main/pnr/clock/logs/clock.log"
+
+log_signature() {
+  stat -c '%Y %s' "$CLOCK_LOG" 2> /dev/null
+}
+
+# Blocks for up to $1 seconds, returning early once clock.log's mtime or size changes.
+wait_for_activity() {
+  local timeout=$1
+  local before waited=0
+  before=$(log_signature)
+  while [ "$waited" -lt "$timeout" ]; do
+    sleep "$POLL_MIN"
+    waited=$(( waited + POLL_MIN ))
+    if [ "$(log_signature)" != "$before" ]; then
+      return 0
+    fi
+  done
+}
+
+poll_interval=$POLL_MIN
+last_status=""
 
 while true; do
-  status=$(bob info -r "$RUN_NAME" -O '@JOBNAME@ @STATUS@' | grep "pnr/clock" | awk '{print $2}' | tr -d '[:space:]')
-  
+  status=$(clock_status)
+
+  if [ "$status" != "$last_status" ]; then
+    poll_interval=$POLL_MIN
+    last_status=$status
+  fi
+
   case "$status" in
     VALID)
       log_succ "Job pnr/clock completed successfully."
-      exit 0
+      finish VALID $EXIT_VALID
       ;;
     FAILED)
       log_err "Job pnr/clock FAILED."
-      exit 1
+      finish FAILED $EXIT_FAILED
       ;;
     INVALID)
       ((RETRY_COUNT++))
       if [ "$RETRY_COUNT" -gt "$MAX_RETRIES" ]; then
         log_err "Job keeps reverting to INVALID. Aborting."
-        exit 1
+        finish INVALID $EXIT_INVALID
       fi
       log_warn "Job INVALID (Retry $RETRY_COUNT/$MAX_RETRIES). Re-submitting..."
       bob update status -f -i -b "$BLOCK_NAME" -r "$RUN_NAME" --force_validate $PREREQ_NODES
       bob run -r "$RUN_NAME" --node pnr/clock --force
+      last_status=""
       sleep 10
       ;;
     *)
-      log_info "pnr/clock status: $status. Waiting 5 minutes..."
-      sleep 300
+      if [ "$status" = "RUNNING" ] && [ -z "$STARTED_MARKED" ]; then
+        mark_phase started
+        STARTED_MARKED=1
+      fi
+      log_info "pnr/clock status: $status. Next check within ${poll_interval}s..."
+      wait_for_activity "$poll_interval"
+      poll_interval=$(( poll_interval * 2 ))
+      if [ "$poll_interval" -gt "$POLL_MAX" ]; then
+        poll_interval=$POLL_MAX
+      fi
       ;;
   esac
 done
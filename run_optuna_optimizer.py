@@ -6,17 +6,37 @@ Supports both SQLite and PostgreSQL backends.
 """
 
 import argparse
+import collections
+import contextlib
 import logging
 import os
 import re
+import signal
+import socket
+import statistics
 import subprocess
 import sys
+import threading
+import time
 import urllib.parse
+import warnings
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from dataclasses import dataclass
-from typing import List, Optional, Tuple
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Tuple, Union
 
 import optuna
 
+import workspace_gc
+from bob_driver import BobBackend, FakeBobBackend, FlowDriver
+from flow_scheduler import DEFAULT_SOCKET, SchedulerClient
+from fatal_patterns import DEFAULT_FATAL_PATTERNS, FatalMatch, FatalPattern, FatalPatternWatcher, LogFollower, load_fatal_patterns
+from trial_metrics import MetricsSink, PhaseTimer
+from surrogate_gate import SurrogateGate, cell_set_features
+from storage_utils import create_journal_storage, create_rdb_storage
+from cell_catalog import BUFFER, CLOCK_INVERTER, CellCatalog, cell_set_hash, load_cell_list
+import cts_log_parser
+from cts_log_parser import SkewTable, parse_log_line
+
 # --- Logging Configuration ---
 logging.basicConfig(
     level=logging.INFO,
@@ -25,6 +45,39 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Exit codes of run_flow_parameterized.sh -> final pnr/clock status
+# (NOT_FOUND: attach mode found no Bob run to attach to)
+FLOW_EXIT_STATUS = {0: 'VALID', 1: 'FAILED', 2: 'INVALID', 3: 'NOT_FOUND'}
+
+# Objective modes: folded latency + skew penalty, latency with a skew constraint,
+# or (latency, skew) as two objectives (also constrained)
+OBJECTIVE_MODES = ('penalty', 'constrained', 'multi')
+
+# Run provisioning: a fresh `bob create` + link + force-validate per trial, or a copy
+# of a template run built once per study
+PROVISION_MODES = ('create', 'clone')
+
+# How trial runs are driven: one run_flow_parameterized.sh process per trial, one
+# in-process FlowDriver per worker (batched Bob status queries) against Bob or a fake,
+# or the host's flow_scheduler.py daemon
+FLOW_DRIVERS = ('shell', 'python', 'fake', 'scheduler')
+
+# Sourced by the template run's clock callback; each cloned run gets its own copy
+OVERRIDES_TCL = 'optuna_overrides.tcl'
+
+# --parallel-sampling: seconds between publishing a trial's cell_set_hash and deciding
+# its claim. Must exceed the time a storage write takes to reach the other workers.
+CLAIM_SETTLE_SECONDS = 5.0
+
+# Trials that ran no flow of their own and do not count towards --trials: cell-set
+# trials that hit an evaluated (or running) cell set and queued a new one instead, and
+# candidates the surrogate gate rejected. After MAX_FREE_TRIALS of them in a row the
+# budget closes anyway.
+FREE_TRIAL_ATTRS = ('resampled', 'gate_rejected')
+MAX_FREE_TRIALS = 200
+
+ObjectiveValue = Union[float, Tuple[float, float]]
+
 @dataclass
 class OptimizerConfig:
     wa_name: str
@@ -36,94 +89,242 @@ class OptimizerConfig:
     source_dir: str
     trials: int
     skew_constraint: float
-    storage_url: str
+    storage_url: str  # RDB URL, or the journal file path when db_type is 'journal'
     vt_types: List[str]
     min_drive_range: Tuple[int, int]
     max_drive_range: Tuple[int, int]
     buffer_list_path: str = 'usable_buffers.list'
     inverter_list_path: str = 'usable_inverters.list'
+    concurrency: int = 1
+    cancel_script_path: str = './cancel_flow_parameterized.sh'
+    prune: bool = False
+    tail_interval: float = 60.0
+    result_cache: bool = True
+    search_space: str = 'drive-range'
+    objective_mode: str = 'penalty'
+    sampler: str = 'tpe'
+    parallel_sampling: bool = False
+    results_dir: str = 'results'
+    heartbeat_interval: int = 60
+    heartbeat_grace: Optional[int] = 600
+    max_retry: int = 2
+    db_type: str = 'sqlite'
+    engine_kwargs: Optional[Dict[str, Any]] = None  # SQLAlchemy engine/pool options for RDB storage
+    provision: str = 'create'
+    template_run: Optional[str] = None  # Defaults to '<study_name>_template'
+    flow_driver: str = 'shell'
+    scheduler_socket: str = DEFAULT_SOCKET
+    adaptive_concurrency: bool = False  # `concurrency` is then the upper bound
+    min_concurrency: int = 1
+    target_queue_wait: float = 900.0
+    fatal_patterns: Optional[List[FatalPattern]] = None  # None disables the fatal-pattern watch
+    metrics_jsonl: Optional[str] = None
+    metrics_prom: Optional[str] = None
+    worker_id: Optional[str] = None  # Stable owner name for --resume; defaults to <host>:<pid>
+    surrogate_gate: bool = False
+    gate_min_trials: int = 20
+    gate_quantile: float = 0.75
+    gate_epsilon: float = 0.1
+
+class FlowAborted(Exception):
+    """A fatal pattern showed up in a running trial's logs; its job was killed."""
+
+class ClockLogTailer:
+    """Incrementally reads skew-group rows from a clock.log that is still being written."""
+    def __init__(self, log_path: str):
+        self.follower = LogFollower(log_path)
+
+    def poll(self) -> List[Tuple[float, float]]:
+        """Returns (latency, skew) rows from lines completed since the last poll."""
+        rows = (parse_log_line(line) for line in self.follower.lines())
+        return [(row.max_id, row.skew) for row in rows if row is not None and row.is_target()]
 
 class CTSObjective:
     def __init__(self, config: OptimizerConfig):
         self.config = config
-        self.full_buffers = self._load_cells(config.buffer_list_path)
-        self.full_inverters = self._load_cells(config.inverter_list_path)
+        full_buffers = load_cell_list(config.buffer_list_path)
+        full_inverters = load_cell_list(config.inverter_list_path)
         
-        if not self.full_buffers or not self.full_inverters:
+        if not full_buffers or not full_inverters:
             logger.error("Required cell list files are missing or empty.")
             sys.exit(1)
+        self.catalog = CellCatalog.from_lists(full_buffers, full_inverters)
+        self.drive_levels: Dict[str, Tuple[List[float], List[int]]] = {}
+        if config.search_space == 'cell-set':
+            self.drive_levels = self._drive_levels()
+        self.metrics = MetricsSink(config.metrics_jsonl, config.metrics_prom) \
+            if config.metrics_jsonl or config.metrics_prom else None
+        self.gate = SurrogateGate(config.vt_types, self._completed_score, self._trial_features, config.gate_min_trials,
+                                  config.gate_quantile, config.gate_epsilon) if config.surrogate_gate else None
+        self.driver: Optional[Union[FlowDriver, SchedulerClient]] = None
+        if config.flow_driver == 'scheduler':
+            self.driver = SchedulerClient(config.wa_name, config.block_name, config.source_dir, config.scheduler_socket)
+        elif config.flow_driver != 'shell':
+            backend = FakeBobBackend() if config.flow_driver == 'fake' else BobBackend()
+            self.driver = FlowDriver(backend, config.wa_name, config.block_name, config.source_dir,
+                                     poll_min=float(os.environ.get('POLL_MIN', 10)),
+                                     poll_max=float(os.environ.get('POLL_MAX', 60)))
 
-    def _load_cells(self, filepath: str) -> List[str]:
-        if not os.path.exists(filepath):
-            logger.warning(f"File not found: {filepath}")
-            return []
-        with open(filepath, 'r') as f:
-            return [line.strip() for line in f if line.strip()]
-
-    def _filter_cells(self, cell_list: List[str], vt: str, min_d: int, max_d: int) -> List[str]:
-        selected = []
-        # Matches D1, D2, D0P5, etc.
-        pattern = re.compile(r'D(\d+P\d+|\d+)')
-        for cell in cell_list:
-            if vt in cell:
-                match = pattern.search(cell)
-                if match:
-                    try:
-                        strength = float(match.group(1).replace('P', '.'))
-                        if min_d <= strength <= max_d:
-                            selected.append(cell)
-                    except ValueError:
-                        continue
-        return selected
-
-    def parse_clock_log(self, log_path: str) -> Tuple[Optional[float], Optional[float]]:
-        """Extracts Max Latency and Skew from clock.log."""
-        if not os.path.exists(log_path):
-            return None, None
+    def _drive_levels(self) -> Dict[str, Tuple[List[float], List[int]]]:
+        """
+        Per VT, every drive strength in the catalog (buffers or clock inverters, ascending)
+        and, for each min index, the lowest max index whose range holds enough of both
+        classes to skip the _select_cells failsafe. Each level adds at least one cell, so
+        every (vt, min index, max index) a trial can suggest selects a distinct cell set.
+        """
+        drive_levels: Dict[str, Tuple[List[float], List[int]]] = {}
+        for vt in self.config.vt_types:
+            levels = sorted(set(self.catalog.drives(BUFFER, vt)) | set(self.catalog.drives(CLOCK_INVERTER, vt)))
+            needed = {cell_class: min(5, len(self.catalog.cells(cell_class, vt)))
+                      for cell_class in (BUFFER, CLOCK_INVERTER)}
+            floors = []
+            for i in range(len(levels)):
+                floor = next((j for j in range(i, len(levels))
+                              if all(len(self.catalog.select(cell_class, vt, levels[i], levels[j])) >= n
+                                     for cell_class, n in needed.items())), None)
+                if floor is None:
+                    break
+                floors.append(floor)
+            if floors:
+                drive_levels[vt] = (levels, floors)
+        if not drive_levels:
+            logger.error(f"No usable drive strengths found for VTs {self.config.vt_types}.")
+            sys.exit(1)
+        n_ranges = sum(len(levels) - floor for levels, floors in drive_levels.values() for floor in floors)
+        logger.info(f"Search space: {n_ranges} distinct cell sets over "
+                    + ", ".join(f"{vt}: {len(levels)} drive levels ({levels[0]:g}-{levels[-1]:g})"
+                                for vt, (levels, _) in drive_levels.items()) + ".")
+        return drive_levels
 
-        max_skew = -1.0
-        max_latency = -1.0
-        found = False
+    def _suggest(self, trial: optuna.Trial) -> Tuple[str, float, float]:
+        """Suggests (vt, min_drive, max_drive) according to the configured search space."""
+        if self.drive_levels:
+            vt = trial.suggest_categorical('vt_type', list(self.drive_levels))
+            levels, floors = self.drive_levels[vt]
+            # Per-VT names: index i is a different drive strength in each VT's level list
+            min_idx = trial.suggest_int(f'min_drive_idx_{vt}', 0, len(floors) - 1)
+            max_idx = trial.suggest_int(f'max_drive_idx_{vt}', floors[min_idx], len(levels) - 1)
+            min_d, max_d = levels[min_idx], levels[max_idx]
+            # Record the decoded range so analysis sees the same fields in both modes
+            trial.set_user_attr('vt_type', vt)
+            trial.set_user_attr('min_drive', min_d)
+            trial.set_user_attr('max_drive', max_d)
+            return vt, min_d, max_d
+        vt = trial.suggest_categorical('vt_type', self.config.vt_types)
+        min_d = trial.suggest_int('min_drive', *self.config.min_drive_range)
+        max_d = trial.suggest_int('max_drive', max(min_d, self.config.max_drive_range[0]), self.config.max_drive_range[1])
+        return vt, min_d, max_d
+
+    def _select_cells(self, vt: str, min_d: float, max_d: float) -> Tuple[List[str], List[str]]:
+        """Resolves a (vt, drive range) suggestion to the final (buffers, inverters) lists."""
+        sel_bufs = self.catalog.select(BUFFER, vt, min_d, max_d)
+        # Exclude standard INVD cells as requested in previous scripts
+        sel_invs = self.catalog.select(CLOCK_INVERTER, vt, min_d, max_d)
+
+        # Failsafe: Ensure we have enough cells
+        if len(sel_bufs) < 5: sel_bufs = self.catalog.cells(BUFFER, vt)[:10]
+        if len(sel_invs) < 5: sel_invs = self.catalog.cells(CLOCK_INVERTER, vt)[:10]
+        return sel_bufs, sel_invs
 
+    def _lookup_cache(self, trial: optuna.Trial, config_hash: str) -> Optional[optuna.trial.FrozenTrial]:
+        """Finds a completed trial in the study that already ran the same cell set."""
+        for done in trial.study.get_trials(deepcopy=False, states=(optuna.trial.TrialState.COMPLETE,)):
+            attrs = done.user_attrs
+            if attrs.get('cell_set_hash') == config_hash and 'latency' in attrs and 'skew' in attrs:
+                return done
+        return None
+
+    def _resample(self, trial: optuna.Trial, vt: str, content: str):
+        """
+        Cell-set mode, for a trial whose cell set is already evaluated or running: queues
+        the drive range nearest to the suggested one (same VT first) whose cell set no
+        trial has taken, and marks this trial `resampled` so it does not count towards
+        --trials. Queued trials carry their cell_set_hash, so other workers skip them too.
+        """
+        taken = {t.user_attrs['cell_set_hash'] for t in trial.study.get_trials(
+                     deepcopy=False, states=(optuna.trial.TrialState.COMPLETE, optuna.trial.TrialState.RUNNING,
+                                             optuna.trial.TrialState.WAITING))
+                 if 'cell_set_hash' in t.user_attrs}
+        min_idx, max_idx = trial.params[f'min_drive_idx_{vt}'], trial.params[f'max_drive_idx_{vt}']
+        candidates = []
+        for other_vt, (levels, floors) in self.drive_levels.items():
+            for i, floor in enumerate(floors):
+                for j in range(floor, len(levels)):
+                    sel_bufs, sel_invs = self._select_cells(other_vt, levels[i], levels[j])
+                    config_hash = cell_set_hash(content, sel_invs, sel_bufs)
+                    if config_hash not in taken:
+                        distance = (other_vt != vt, abs(i - min_idx) + abs(j - max_idx))
+                        candidates.append((distance, other_vt, i, j, config_hash))
+        if not candidates:
+            logger.info(f"Trial {trial.number}: every cell set in the search space has been evaluated.")
+            return
+        _, other_vt, i, j, config_hash = min(candidates)
+        levels = self.drive_levels[other_vt][0]
+        trial.study.enqueue_trial({'vt_type': other_vt, f'min_drive_idx_{other_vt}': i, f'max_drive_idx_{other_vt}': j},
+                                  user_attrs={'cell_set_hash': config_hash, 'resample_of': trial.number})
+        trial.set_user_attr('resampled', True)
+        logger.info(f"Trial {trial.number}: queued the nearest new cell set instead, {other_vt} drives "
+                    f"{levels[i]:g}-{levels[j]:g} ({config_hash}).")
+
+    def _claim(self, trial: optuna.Trial, config_hash: str, published_at: float) -> Optional[int]:
+        """
+        Claims the trial's cell set among the RUNNING trials of all workers. Returns the
+        number of a trial that keeps it instead, or None after marking this one `claimed`.
+        Each trial publishes its hash, waits CLAIM_SETTLE_SECONDS, then yields to any
+        RUNNING trial with the same hash that is lower-numbered or already claimed. Of two
+        racing trials, either the higher one sees the lower one's hash and yields, or it
+        claimed before the lower one published, and the lower one sees that claim.
+        """
+        time.sleep(max(0.0, published_at + CLAIM_SETTLE_SECONDS - time.time()))
+        owners = [running.number
+                  for running in trial.study.get_trials(deepcopy=False, states=(optuna.trial.TrialState.RUNNING,))
+                  if running.number != trial.number and running.user_attrs.get('cell_set_hash') == config_hash
+                  and (running.number < trial.number or running.user_attrs.get('claimed'))]
+        if owners:
+            return min(owners)
+        trial.set_user_attr('claimed', True)
+        return None
+
+    def parse_clock_log(self, log_path: str) -> Optional[SkewTable]:
+        """Extracts every skew-group row from clock.log."""
+        if not os.path.exists(log_path):
+            return None
         try:
-            with open(log_path, 'r') as f:
-                for line in f:
-                    if "ssgnp_" in line and "CLK/" in line:
-                        parts = line.split()
-                        try:
-                            # Robustly find data columns
-                            base_idx = next(i for i, p in enumerate(parts) if p.startswith("ssgnp_"))
-                            latency = float(parts[base_idx + 3])
-                            skew = float(parts[base_idx + 4])
-                            if skew > max_skew:
-                                max_skew = skew
-                                max_latency = latency
-                                found = True
-                        except (IndexError, ValueError, StopIteration):
-                            continue
+            return cts_log_parser.parse_clock_log(log_path)
         except Exception as e:
             logger.error(f"Error parsing log {log_path}: {e}")
-            
-        return (max_latency, max_skew) if found else (None, None)
+            return None
+
+    def _record_skew_table(self, trial: optuna.Trial, run_name: str, table: SkewTable):
+        """Keeps the parsed skew groups with the trial: final table as a user attribute, all rows in a sidecar."""
+        sidecar = os.path.join(self.config.results_dir, f"{run_name}.skew.json")
+        try:
+            table.save_json(sidecar)
+            trial.set_user_attr('skew_table_path', sidecar)
+        except OSError as e:
+            logger.warning(f"Could not write skew table sidecar {sidecar}: {e}")
+        trial.set_user_attr('skew_table', table.last_table().to_dict())
+
+    def __call__(self, trial: optuna.Trial) -> ObjectiveValue:
+        timer = PhaseTimer(trial, self.metrics)
+        try:
+            return self._evaluate(trial, timer)
+        finally:
+            timer.finish()
 
-    def __call__(self, trial: optuna.Trial) -> float:
+    def _evaluate(self, trial: optuna.Trial, timer: PhaseTimer) -> ObjectiveValue:
         trial_num = trial.number
-        vt = trial.suggest_categorical('vt_type', self.config.vt_types)
-        min_d = trial.suggest_int('min_drive', *self.config.min_drive_range)
-        max_d = trial.suggest_int('max_drive', max(min_d, self.config.max_drive_range[0]), self.config.max_drive_range[1])
+        record_owner(trial, self.config.worker_id)
+        # Set when resuming a RUNNING trial, or when the stale-trial reaper
+        # re-enqueued a trial whose worker died
+        previous_run = trial.user_attrs.get('run_name')
+        vt, min_d, max_d = self._suggest(trial)
 
         run_name = f"{self.config.run_prefix}_trial_{trial_num}"
         var_file = f"vars_{run_name}.var"
+        timer.run_name = previous_run or run_name
 
-        # Prepare overrides
-        sel_bufs = self._filter_cells(self.full_buffers, vt, min_d, max_d)
-        # Exclude standard INVD cells as requested in previous scripts
-        inv_candidates = [c for c in self.full_inverters if not c.startswith('INV')]
-        sel_invs = self._filter_cells(inv_candidates, vt, min_d, max_d)
-
-        # Failsafe: Ensure we have enough cells
-        if len(sel_bufs) < 5: sel_bufs = [c for c in self.full_buffers if vt in c][:10]
-        if len(sel_invs) < 5: sel_invs = [c for c in inv_candidates if vt in c][:10]
+        sel_bufs, sel_invs = self._select_cells(vt, min_d, max_d)
 
         buf_str = " ".join(sel_bufs)
         inv_str = " ".join(sel_invs)
@@ -131,53 +332,684 @@ class CTSObjective:
         # Read base var file
         if not os.path.exists(self.config.base_var):
             logger.error(f"Base var file {self.config.base_var} missing.")
-            return float('inf')
+            return self._failed_value()
 
         with open(self.config.base_var, 'r') as f:
             content = f.read()
 
-        overrides = f"""
+        config_hash = cell_set_hash(content, sel_invs, sel_bufs)
+        trial.set_user_attr('cell_set_hash', config_hash)
+        hash_published_at = time.time()
+        trial.set_user_attr('n_buffers', len(sel_bufs))
+        trial.set_user_attr('n_inverters', len(sel_invs))
+        timer.lap('suggest')
+
+        returncode = self._attach(trial, previous_run, timer) if previous_run else None
+        if returncode is not None:
+            run_name = previous_run
+        else:
+            if self.config.result_cache:
+                cached = self._lookup_cache(trial, config_hash)
+                if cached is not None:
+                    timer.lap('cache_lookup')
+                    latency, skew = cached.user_attrs['latency'], cached.user_attrs['skew']
+                    trial.set_user_attr('latency', latency)
+                    trial.set_user_attr('skew', skew)
+                    trial.set_user_attr('cache_hit_of', cached.number)
+                    logger.info(f"Trial {trial_num}: cell set {config_hash} already evaluated by trial {cached.number}. "
+                                f"Latency={latency:.4f}, Skew={skew:.4f}")
+                    if self.drive_levels:
+                        self._resample(trial, vt, content)
+                    return self._objective_value(latency, skew)
+            timer.lap('cache_lookup')
+
+            if self.gate is not None:
+                features = cell_set_features(vt, min_d, max_d, sel_bufs, sel_invs, self.catalog)
+                launch = self.gate.screen(trial, vt, features)
+                timer.lap('gate')
+                if not launch:
+                    raise optuna.TrialPruned()
+
+            if self.config.parallel_sampling:
+                owner = self._claim(trial, config_hash, hash_published_at)
+                timer.lap('claim')
+                if owner is not None:
+                    trial.set_user_attr('duplicate_of', owner)
+                    logger.info(f"Trial {trial_num}: cell set {config_hash} is already running as trial {owner}. Skipping.")
+                    if self.drive_levels:
+                        self._resample(trial, vt, content)
+                    raise optuna.TrialPruned()
+
+            overrides_tcl = (f"set_ccopt_property inverter_cells {{{inv_str}}}\n"
+                             f"set_ccopt_property buffer_cells {{{buf_str}}}\n")
+            overrides = f"""
 # --- Optuna Overrides ---
 bbappend pnr.innovus.ClockBuildClockTreePreCallback {{
     set_ccopt_property inverter_cells {{{inv_str}}}
     set_ccopt_property buffer_cells {{{buf_str}}}
 }}
 """
-        with open(var_file, 'w') as f:
-            f.write(content + "\n" + overrides)
+            with open(var_file, 'w') as f:
+                f.write(content + "\n" + overrides)
+            if self.config.provision == 'clone':
+                self._write_template_var(content)
+                with open(f"vars_{run_name}.tcl", 'w') as f:
+                    f.write(overrides_tcl)
+            timer.lap('var_file')
 
-        logger.info(f"Starting Trial {trial_num}: {run_name}")
-        os.makedirs("logs", exist_ok=True)
-        bash_log = f"logs/{run_name}.log"
+            logger.info(f"Starting Trial {trial_num}: {run_name}")
+            returncode = self._run_flow(trial, run_name, timer)
 
-        try:
-            with open(bash_log, 'w') as f:
-                subprocess.run([
-                    self.config.script_path, run_name, "../../" + var_file,
-                    self.config.wa_name, self.config.block_name, self.config.source_dir
-                ], check=True, stdout=f, stderr=subprocess.STDOUT)
-        except subprocess.CalledProcessError:
-            logger.warning(f"Flow script failed for trial {trial_num}. Attempting to salvage data.")
+        if returncode != 0:
+            status = FLOW_EXIT_STATUS.get(returncode, f"exit {returncode}")
+            logger.warning(f"Flow script ended with {status} for trial {trial_num}. Attempting to salvage data.")
 
         # Results parsing
-        clock_log = os.path.join(self.config.wa_name, 'run', run_name, 'main', 'pnr', 'clock', 'logs', 'clock.log')
-        latency, skew = self.parse_clock_log(clock_log)
+        table = self.parse_clock_log(self._clock_log(run_name))
+        worst = table.worst() if table else None
+        timer.lap('parse')
 
-        if latency is None:
+        if worst is None:
             logger.error(f"Trial {trial_num} failed: No timing data found.")
-            return float('inf')
+            return self._failed_value()
 
-        # Objective: Minimize latency with a heavy penalty for skew violations
-        score = latency
+        latency, skew = worst
+        self._record_skew_table(trial, run_name, table)
+
+        trial.set_user_attr('latency', latency)
+        trial.set_user_attr('skew', skew)
         if skew > self.config.skew_constraint:
-            penalty = (skew - self.config.skew_constraint) * 100
-            score += penalty
-            logger.info(f"Skew violation: {skew:.4f} > {self.config.skew_constraint}. Score: {score:.4f}")
+            logger.info(f"Skew violation: {skew:.4f} > {self.config.skew_constraint}. Score: {self._score(latency, skew):.4f}")
         else:
             logger.info(f"Result: Latency={latency:.4f}, Skew={skew:.4f}")
 
+        return self._objective_value(latency, skew)
+
+    @property
+    def template_run(self) -> str:
+        return self.config.template_run or f"{self.config.study_name}_template"
+
+    def _write_template_var(self, content: str):
+        """
+        Writes the template run's var file: the base var plus a clock callback that
+        sources the per-run overrides from the clock node directory. The flow script
+        only reads it when the template run does not exist yet.
+        """
+        path = f"vars_{self.template_run}.var"
+        hook = f"""
+# --- Optuna Overrides (template: sourced per cloned run) ---
+bbappend pnr.innovus.ClockBuildClockTreePreCallback {{
+    if {{[file exists {OVERRIDES_TCL}]}} {{
+        puts "INFO (Optuna): Sourcing {OVERRIDES_TCL}"
+        source {OVERRIDES_TCL}
+    }}
+}}
+"""
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(content + "\n" + hook)
+        os.replace(tmp_path, path)
+
+    def _run_dir(self, run_name: str) -> str:
+        return os.path.join(self.config.wa_name, 'run', run_name)
+
+    def _clock_log(self, run_name: str) -> str:
+        return os.path.join(self._run_dir(run_name), 'main', 'pnr', 'clock', 'logs', 'clock.log')
+
+    def _attach(self, trial: optuna.Trial, run_name: str, timer: PhaseTimer) -> Optional[int]:
+        """
+        Waits on the existing Bob run of a resumed or retried trial instead of starting
+        a new one. Returns the flow exit code, or None if there is no run to attach to.
+        """
+        if not os.path.isdir(self._run_dir(run_name)):
+            return None
+        logger.info(f"Trial {trial.number}: re-attaching to Bob run {run_name}.")
+        trial.set_user_attr('reattached_run', run_name)
+        returncode = self._run_flow(trial, run_name, timer, attach=True)
+        if FLOW_EXIT_STATUS.get(returncode) == 'NOT_FOUND':
+            logger.warning(f"Bob has no job for {run_name}; starting trial {trial.number} from scratch.")
+            return None
+        return returncode
+
+    def _run_flow(self, trial: optuna.Trial, run_name: str, timer: PhaseTimer, attach: bool = False) -> int:
+        """
+        Runs the flow for `run_name` and returns its exit code. In attach mode
+        (ATTACH_ONLY=1) create/submit is skipped and an existing run is only polled.
+        """
+        trial.set_user_attr('run_name', run_name)
+        timer.run_name = run_name
+        os.makedirs("logs", exist_ok=True)
+        log_path = f"logs/{run_name}.log"
+        clone = self.config.provision == 'clone'
+        if self.driver is not None:
+            if not attach:
+                open(log_path, 'w').close()
+            run = self.driver.start(
+                run_name, f"../../vars_{run_name}.var", log_path, attach=attach,
+                template_run=self.template_run if clone else None,
+                template_var=os.path.abspath(f"vars_{self.template_run}.var"),
+                overrides_tcl=os.path.abspath(f"vars_{run_name}.tcl")
+            )
+            try:
+                return self._wait_flow(trial, run.wait, lambda: self.driver.cancel(run), run_name, attach)
+            finally:
+                if not attach:
+                    self._record_flow_phases(trial, timer, run.created_at, run.submitted_at,
+                                             run.started_at, run.finished_at or time.time())
+                timer.lap('flow')
+
+        env = None
+        if attach:
+            env = dict(os.environ, ATTACH_ONLY='1')
+        elif clone:
+            env = dict(os.environ, PROVISION_MODE='clone', TEMPLATE_RUN=self.template_run,
+                       TEMPLATE_VAR=os.path.abspath(f"vars_{self.template_run}.var"),
+                       OVERRIDES_TCL=os.path.abspath(f"vars_{run_name}.tcl"))
+        created_at = time.time()
+        try:
+            with open(log_path, 'a' if attach else 'w') as f:
+                proc = subprocess.Popen([
+                    self.config.script_path, run_name, f"../../vars_{run_name}.var",
+                    self.config.wa_name, self.config.block_name, self.config.source_dir
+                ], stdout=f, stderr=subprocess.STDOUT, start_new_session=True, env=env)
+                return self._wait_flow(trial, lambda timeout: _wait_proc(proc, timeout),
+                                       lambda: self._cancel_flow(proc, run_name), run_name, attach)
+        finally:
+            if not attach:
+                marks = _phase_marks(log_path)
+                self._record_flow_phases(trial, timer, created_at, marks.get('submitted'),
+                                         marks.get('started'), time.time())
+            timer.lap('flow')
+
+    def _record_flow_phases(self, trial: optuna.Trial, timer: PhaseTimer, created_at: float,
+                            submitted_at: Optional[float], started_at: Optional[float], finished_at: float):
+        """
+        Splits a flow run into provisioning, grid queue wait, CTS runtime (until clock.log
+        was last written) and polling slack (until the finish was noticed). Also keeps
+        the queue wait and turnaround as user attributes for the ConcurrencyThrottle.
+        """
+        if submitted_at is None:
+            return
+        timer.record('provision', submitted_at - created_at)
+        if started_at is not None:
+            timer.record('queue_wait', started_at - submitted_at)
+            trial.set_user_attr('queue_wait', round(started_at - submitted_at, 1))
+        trial.set_user_attr('turnaround', round(finished_at - submitted_at, 1))
+
+        clock_log = self._clock_log(timer.run_name)
+        log_end = os.path.getmtime(clock_log) if os.path.exists(clock_log) else None
+        run_start = started_at or submitted_at
+        if log_end is not None and run_start < log_end <= finished_at:
+            timer.record('cts_runtime', log_end - run_start)
+            timer.record('poll_slack', finished_at - log_end)
+
+    def _objective_value(self, latency: float, skew: float) -> ObjectiveValue:
+        if self.config.objective_mode == 'multi':
+            return latency, skew
+        if self.config.objective_mode == 'constrained':
+            return latency
+        return self._score(latency, skew)
+
+    def _failed_value(self) -> ObjectiveValue:
+        return (float('inf'), float('inf')) if self.config.objective_mode == 'multi' else float('inf')
+
+    def constraints(self, trial: optuna.trial.FrozenTrial) -> Sequence[float]:
+        """Skew constraint for Optuna's constraints_func: feasible when <= 0."""
+        skew = trial.user_attrs.get('skew', trial.user_attrs.get('pruned_skew'))
+        if skew is None:
+            return (float('inf'),)
+        return (skew - self.config.skew_constraint,)
+
+    def _trial_features(self, trial: optuna.trial.FrozenTrial) -> Optional[Tuple[str, Dict[str, float]]]:
+        """(VT, cell-set features) of a past trial, from its decoded or suggested drive range."""
+        source = trial.user_attrs if 'vt_type' in trial.user_attrs else trial.params
+        if not all(key in source for key in ('vt_type', 'min_drive', 'max_drive')):
+            return None
+        vt, min_d, max_d = source['vt_type'], source['min_drive'], source['max_drive']
+        sel_bufs, sel_invs = self._select_cells(vt, min_d, max_d)
+        return vt, cell_set_features(vt, min_d, max_d, sel_bufs, sel_invs, self.catalog)
+
+    def _completed_score(self, trial: optuna.trial.FrozenTrial) -> Optional[float]:
+        """Penalty score of a finished trial, whatever the objective mode (surrogate gate target)."""
+        if 'latency' not in trial.user_attrs or 'skew' not in trial.user_attrs:
+            return None
+        return self._score(trial.user_attrs['latency'], trial.user_attrs['skew'])
+
+    def _score(self, latency: float, skew: float) -> float:
+        """Objective: Minimize latency with a heavy penalty for skew violations."""
+        score = latency
+        if skew > self.config.skew_constraint:
+            score += (skew - self.config.skew_constraint) * 100
         return score
 
+    def _wait_flow(self, trial: optuna.Trial, wait_flow: Callable[[Optional[float]], Optional[int]],
+                   cancel: Callable[[], None], run_name: str, attach: bool = False) -> int:
+        """
+        Waits for the flow to finish; `wait_flow(timeout)` returns its exit code, or None
+        while it is still running. While the job runs, its logs are read every
+        tail_interval seconds: with pruning enabled, the worst clock.log skew row seen so
+        far is reported as an intermediate value (one step per row) and the job is
+        cancelled if pruned; with the fatal-pattern watch, a matching line in clock.log
+        or the flow log cancels the job and aborts the trial (see _abort).
+        """
+        if not self.config.prune and self.config.fatal_patterns is None:
+            return wait_flow(None)
+
+        clock_log = self._clock_log(run_name)
+        tailer = ClockLogTailer(clock_log) if self.config.prune else None
+        watcher = None
+        if self.config.fatal_patterns is not None:
+            # A fresh run's flow log was just truncated and is read from the start, so
+            # create/submit errors count; when re-attaching it holds an earlier attempt's lines
+            watcher = FatalPatternWatcher(self.config.fatal_patterns, [
+                LogFollower(clock_log), LogFollower(f"logs/{run_name}.log", from_end=attach)
+            ])
+        step = 0
+        worst: Optional[Tuple[float, float]] = None
+        while True:
+            returncode = wait_flow(self.config.tail_interval)
+            if returncode is not None:
+                return returncode
+            match = watcher.poll() if watcher else None
+            if match is not None:
+                self._abort(trial, match, cancel)
+            if tailer is None:
+                continue
+            for row in tailer.poll():
+                if worst is None or row[1] > worst[1]:
+                    worst = row
+                trial.report(self._score(*worst), step)
+                step += 1
+            if worst is not None and trial.should_prune():
+                latency, skew = worst
+                logger.info(f"Pruning trial {trial.number} at step {step}: Latency={latency:.4f}, Skew={skew:.4f}")
+                trial.set_user_attr('pruned_latency', latency)
+                trial.set_user_attr('pruned_skew', skew)
+                cancel()
+                raise optuna.TrialPruned()
+
+    def _abort(self, trial: optuna.Trial, match: FatalMatch, cancel: Callable[[], None]):
+        """Kills the job on a fatal-pattern match and ends the trial as FAIL or PRUNED with the reason."""
+        logger.warning(f"Trial {trial.number}: '{match.pattern.name}' in {match.path}: {match.line}")
+        trial.set_user_attr('abort_reason', match.pattern.name)
+        trial.set_user_attr('abort_line', match.line)
+        cancel()
+        if match.pattern.action == 'prune':
+            raise optuna.TrialPruned(f"{match.pattern.name}: {match.line}")
+        raise FlowAborted(f"{match.pattern.name}: {match.line}")
+
+    def _cancel_flow(self, proc: subprocess.Popen, run_name: str):
+        """Stops the flow script's polling loop and cancels its Bob job."""
+        try:
+            os.killpg(proc.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+        proc.wait()
+        result = subprocess.run(
+            [self.config.cancel_script_path, run_name, self.config.wa_name],
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True
+        )
+        if result.returncode != 0:
+            logger.warning(f"Could not cancel Bob job for {run_name}: {result.stdout.strip()}")
+
+def _phase_marks(log_path: str) -> Dict[str, float]:
+    """First `PHASE_MARK <name> <epoch>` line per name printed by the flow script."""
+    marks: Dict[str, float] = {}
+    try:
+        with open(log_path, errors='replace') as f:
+            for line in f:
+                if line.startswith('PHASE_MARK '):
+                    fields = line.split()
+                    if len(fields) == 3:
+                        marks.setdefault(fields[1], float(fields[2]))
+    except (OSError, ValueError):
+        pass
+    return marks
+
+def _wait_proc(proc: subprocess.Popen, timeout: Optional[float]) -> Optional[int]:
+    try:
+        return proc.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return None
+
+def create_storage(config: OptimizerConfig) -> Union[str, optuna.storages.BaseStorage]:
+    """
+    RDB storage with the configured connection pool and trial heartbeats: trials
+    whose worker stops heartbeating for `heartbeat_grace` seconds are failed and
+    re-enqueued with the same parameters (and user attributes, so the retry can
+    re-attach to the original Bob run).
+    """
+    if config.db_type == 'journal':
+        return create_journal_storage(config.storage_url)
+    if config.heartbeat_interval <= 0 and not config.engine_kwargs:
+        return config.storage_url
+    return create_rdb_storage(config.storage_url, config.engine_kwargs, config.heartbeat_interval,
+                              config.heartbeat_grace, config.max_retry)
+
+def postgres_engine_kwargs(pool_size: int, max_overflow: int, pool_recycle: int, pre_ping: bool,
+                           release_idle: bool) -> Dict[str, Any]:
+    """
+    Connection pool options for Postgres workers. A worker spends hours waiting on
+    Bob between storage calls, so `release_idle` drops the pool entirely (NullPool):
+    a connection is opened per ask/tell/attribute write and closed right after, and
+    idle workers hold no server connections.
+    """
+    if release_idle:
+        from sqlalchemy.pool import NullPool
+        return {'poolclass': NullPool}
+    return {
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'pool_recycle': pool_recycle,
+        'pool_pre_ping': pre_ping,
+    }
+
+def create_sampler(config: OptimizerConfig, objective: CTSObjective) -> optuna.samplers.BaseSampler:
+    """Builds the sampler; the non-penalty modes hand the skew limit to it as a constraint."""
+    constraints_func = objective.constraints if config.objective_mode != 'penalty' else None
+    if config.sampler == 'nsga2':
+        return optuna.samplers.NSGAIISampler(constraints_func=constraints_func)
+    # constant_liar treats other workers' RUNNING trials as already (badly) evaluated,
+    # so concurrent workers stop proposing the same region
+    return optuna.samplers.TPESampler(constraints_func=constraints_func, constant_liar=config.parallel_sampling)
+
+def log_best(study: optuna.Study, config: OptimizerConfig):
+    """Logs the best trial, or the feasible Pareto front in multi-objective mode."""
+    try:
+        if config.objective_mode == 'multi':
+            front = sorted(study.best_trials, key=lambda t: t.values[0])
+            logger.info(f"Pareto front ({len(front)} trials):")
+            for t in front:
+                logger.info(f"  Trial {t.number}: Latency={t.values[0]:.4f}, Skew={t.values[1]:.4f}, params={t.params}")
+        else:
+            best = study.best_trial
+            logger.info(f"Best trial {best.number}: value={best.value:.4f}, params={best.params}")
+    except ValueError:
+        logger.info("No completed trials yet.")
+
+class TrialHeartbeat:
+    """
+    Heartbeats for trials run through ask/tell, which (unlike study.optimize) does
+    not record them itself. A background thread beats for every in-flight trial and
+    reaps stale trials left RUNNING by dead workers on each tick.
+    """
+    def __init__(self, study: optuna.Study, interval: float):
+        self.study = study
+        self.interval = interval
+        self._trials: Dict[int, optuna.Trial] = {}
+        self._trial_ids: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="heartbeat", daemon=True)
+
+    def __enter__(self) -> 'TrialHeartbeat':
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def add(self, trial: optuna.Trial):
+        trial_id = storage_trial_id(trial.storage, trial.study.study_name, trial.number)
+        with self._lock:
+            self._trials[trial.number] = trial
+            self._trial_ids[trial.number] = trial_id
+        self._beat(trial)
+
+    def discard(self, trial: optuna.Trial):
+        with self._lock:
+            self._trials.pop(trial.number, None)
+            self._trial_ids.pop(trial.number, None)
+
+    def _beat(self, trial: optuna.Trial):
+        trial.storage.record_heartbeat(self._trial_ids[trial.number])
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            with self._lock:
+                trials = list(self._trials.values())
+            try:
+                for trial in trials:
+                    self._beat(trial)
+                optuna.storages.fail_stale_trials(self.study)
+            except Exception as e:
+                logger.warning(f"Heartbeat failed: {type(e).__name__}: {e}")
+
+def _tell_result(study: optuna.Study, trial: optuna.Trial, future: Future) -> optuna.trial.FrozenTrial:
+    """Reports a finished trial future back to the study."""
+    try:
+        return study.tell(trial, future.result())
+    except optuna.TrialPruned:
+        return study.tell(trial, state=optuna.trial.TrialState.PRUNED)
+    except Exception as e:
+        logger.error(f"Trial {trial.number} raised {type(e).__name__}: {e}")
+        return study.tell(trial, state=optuna.trial.TrialState.FAIL)
+
+class ConcurrencyThrottle:
+    """
+    AIMD limit on a worker's in-flight trials, between min_limit and max_limit. Each
+    finished run's grid queue wait and turnaround feed an EWMA. The grid counts as
+    congested when the queue wait exceeds `target_queue_wait`, or the turnaround
+    exceeds `slowdown` times the baseline: the median of the last `window` raw
+    turnarounds, so a burst of fast failures does not pin it. Congestion, or a run
+    aborted by an infrastructure failure (license, crash, ...), multiplies the limit by
+    `beta`, at most once per window of `limit` finished runs, so trials launched before
+    a cut do not cut again.
+
+    Like TCP slow start, the limit starts at min_limit and grows by one per
+    uncongested run (doubling every window) up to `threshold`, which is max_limit
+    until the first cut and the cut limit afterwards; above it the limit grows by one
+    per window. Reaching max_limit takes about max_limit runs instead of
+    max_limit**2 / 2 with additive growth alone.
+    """
+    def __init__(self, min_limit: int, max_limit: int, target_queue_wait: float,
+                 slowdown: float = 1.5, alpha: float = 0.3, beta: float = 0.7, window: int = 50):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_queue_wait = target_queue_wait
+        self.slowdown = slowdown
+        self.alpha = alpha
+        self.beta = beta
+        self.limit = float(min_limit)
+        self.threshold = float(max_limit)
+        self.queue_wait: Optional[float] = None
+        self.turnaround: Optional[float] = None
+        self.recent_turnarounds: Deque[float] = collections.deque(maxlen=window)
+        self._since_decrease = 0
+
+    @property
+    def value(self) -> int:
+        return int(self.limit)
+
+    def _ewma(self, current: Optional[float], sample: float) -> float:
+        return sample if current is None else self.alpha * sample + (1 - self.alpha) * current
+
+    @property
+    def baseline_turnaround(self) -> Optional[float]:
+        return statistics.median(self.recent_turnarounds) if self.recent_turnarounds else None
+
+    def congested(self) -> bool:
+        if self.queue_wait is not None and self.queue_wait > self.target_queue_wait:
+            return True
+        baseline = self.baseline_turnaround
+        return self.turnaround is not None and baseline is not None and self.turnaround > self.slowdown * baseline
+
+    def _decrease(self):
+        if self._since_decrease >= self.value:
+            self.limit = max(self.min_limit, self.limit * self.beta)
+            self.threshold = self.limit
+            self._since_decrease = 0
+
+    def observe(self, queue_wait: Optional[float], turnaround: Optional[float], failed: bool = False) -> int:
+        """
+        Feeds one finished run (None for unknown) and returns the new limit. `failed`
+        marks a run aborted by an infrastructure failure.
+        """
+        if failed:
+            self._since_decrease += 1
+            self._decrease()
+            return self.value
+        if queue_wait is None and turnaround is None:
+            return self.value  # Cache hit, duplicate or failed before submission
+        if queue_wait is not None:
+            self.queue_wait = self._ewma(self.queue_wait, queue_wait)
+        if turnaround is not None:
+            self.turnaround = self._ewma(self.turnaround, turnaround)
+            self.recent_turnarounds.append(turnaround)
+        self._since_decrease += 1
+
+        if self.congested():
+            self._decrease()
+        elif self.limit < self.threshold:
+            self.limit = min(self.max_limit, self.threshold, self.limit + 1)
+        else:
+            self.limit = min(self.max_limit, self.limit + 1 / self.value)
+        return self.value
+
+class TrialBudget:
+    """
+    Counts a worker's new trials towards --trials, leaving out trials that ran no flow
+    (FREE_TRIAL_ATTRS), so a sampler that keeps returning to evaluated cell sets does
+    not use up the budget. Also a study.optimize callback that stops the study once
+    the budget is spent or MAX_FREE_TRIALS free trials have come in a row.
+    """
+    def __init__(self, n_trials: int, max_free: int = MAX_FREE_TRIALS):
+        self.n_trials = n_trials
+        self.max_free = max_free
+        self.counted = 0
+        self.free = 0
+        self._free_streak = 0
+
+    @property
+    def exhausted(self) -> bool:
+        return self.counted >= self.n_trials or self._free_streak >= self.max_free
+
+    def wants(self, pending: int) -> bool:
+        """Whether to ask for another trial while `pending` new trials are still in flight."""
+        return not self.exhausted and self.counted + pending < self.n_trials
+
+    def observe(self, frozen: optuna.trial.FrozenTrial):
+        if any(attr in frozen.user_attrs for attr in FREE_TRIAL_ATTRS):
+            self.free += 1
+            self._free_streak += 1
+            if self._free_streak == self.max_free:
+                logger.warning(f"The last {self.max_free} trials ran no flow of their own. "
+                               f"Stopping after {self.counted} trials.")
+        else:
+            self.counted += 1
+            self._free_streak = 0
+
+    def __call__(self, study: optuna.Study, frozen: optuna.trial.FrozenTrial):
+        self.observe(frozen)
+        if self.exhausted:
+            study.stop()
+
+def storage_trial_id(storage: optuna.storages.BaseStorage, study_name: str, number: int) -> int:
+    """Storage id of a trial, through the public storage API."""
+    return storage.get_trial_id_from_study_id_trial_number(storage.get_study_id_from_name(study_name), number)
+
+def record_owner(trial: optuna.Trial, worker_id: Optional[str] = None):
+    """Marks the trial as run by this process (see find_resumable_trials)."""
+    host, pid = socket.gethostname(), os.getpid()
+    trial.set_user_attr('worker', worker_id or f"{host}:{pid}")
+    trial.set_user_attr('worker_host', host)
+    trial.set_user_attr('worker_pid', pid)
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def find_resumable_trials(study: optuna.Study, storage: optuna.storages.BaseStorage, run_prefix: str,
+                          worker_id: Optional[str] = None) -> List[optuna.Trial]:
+    """
+    RUNNING trials whose Bob run belongs to `run_prefix` and that were left behind by
+    an earlier process of this worker: recorded with the same `worker_id` or, without
+    one, on this host, and whose process is no longer alive here. Trials of live
+    workers sharing the prefix are never adopted. Wrapped as live trials so they can
+    be told.
+    """
+    pattern = re.compile(rf"{re.escape(run_prefix)}_trial_\d+$")
+    host = socket.gethostname()
+    resumable = []
+    for frozen in study.get_trials(deepcopy=False, states=(optuna.trial.TrialState.RUNNING,)):
+        attrs = frozen.user_attrs
+        if not pattern.match(attrs.get('run_name', '')):
+            continue
+        mine = attrs.get('worker') == worker_id if worker_id else attrs.get('worker_host') == host
+        alive = attrs.get('worker_host') == host and _process_alive(attrs.get('worker_pid', os.getpid()))
+        if mine and not alive:
+            trial_id = storage_trial_id(storage, study.study_name, frozen.number)
+            resumable.append(optuna.trial.Trial(study, trial_id))
+    return resumable
+
+def run_concurrent(study: optuna.Study, objective: CTSObjective, n_trials: int, concurrency: int,
+                   heartbeat_interval: float = 0, resumed: Sequence[optuna.Trial] = (),
+                   callbacks: Sequence[Callable[[optuna.Study, optuna.trial.FrozenTrial], None]] = (),
+                   throttle: Optional[ConcurrencyThrottle] = None):
+    """
+    Keeps up to `concurrency` trials in flight from a single worker using ask/tell.
+    Each trial's var-file generation and flow run happens on a pool thread; the
+    main thread only asks for new trials and tells finished ones. `resumed` trials
+    (already RUNNING) are waited on first and count towards the in-flight slots but
+    not towards `n_trials`, which a TrialBudget counts.
+    `callbacks` run after each tell, like study.optimize callbacks. With a `throttle`,
+    the number of in-flight trials follows its adaptive limit (`concurrency` is the
+    pool size and upper bound).
+    """
+    in_flight = {}
+    budget = TrialBudget(n_trials)
+    heartbeat = TrialHeartbeat(study, heartbeat_interval) if heartbeat_interval > 0 else None
+    if heartbeat:
+        warnings.filterwarnings("ignore", message="Heartbeat of storage is supposed to be used with Study.optimize")
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="trial") as pool, \
+            (heartbeat or contextlib.nullcontext()):
+        for trial in resumed:
+            if heartbeat:
+                heartbeat.add(trial)
+            in_flight[pool.submit(objective, trial)] = trial
+        resumed_numbers = {trial.number for trial in resumed}
+        while True:
+            limit = throttle.value if throttle else concurrency
+            pending = sum(1 for trial in in_flight.values() if trial.number not in resumed_numbers)
+            while len(in_flight) < limit and budget.wants(pending):
+                trial = study.ask()
+                if heartbeat:
+                    heartbeat.add(trial)
+                in_flight[pool.submit(objective, trial)] = trial
+                pending += 1
+            if not in_flight:
+                break
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                trial = in_flight.pop(future)
+                if heartbeat:
+                    heartbeat.discard(trial)
+                frozen = _tell_result(study, trial, future)
+                if trial.number not in resumed_numbers:
+                    budget.observe(frozen)
+                for callback in callbacks:
+                    callback(study, frozen)
+                # Only runs that produced a result say how long a CTS job takes; pruned,
+                # aborted and failed runs end early and would read as a fast grid. Runs
+                # aborted by an infrastructure pattern (FAIL) count as failures.
+                aborted = frozen.state == optuna.trial.TrialState.FAIL and 'abort_reason' in frozen.user_attrs
+                measured = frozen.state == optuna.trial.TrialState.COMPLETE and 'latency' in frozen.user_attrs \
+                    and 'abort_reason' not in frozen.user_attrs
+                if throttle and (aborted or measured):
+                    previous = throttle.value
+                    if throttle.observe(frozen.user_attrs.get('queue_wait'), frozen.user_attrs.get('turnaround'),
+                                        failed=aborted) != previous:
+                        logger.info(f"Concurrency limit {previous} -> {throttle.value} (queue wait "
+                                    f"{throttle.queue_wait or 0:.0f}s, turnaround {throttle.turnaround or 0:.0f}s)")
+            logger.info(f"{budget.counted}/{n_trials} trials finished ({budget.free} without a flow of their own), "
+                        f"{len(in_flight)} in flight")
+
 def main():
     parser = argparse.ArgumentParser(description="Consolidated Optuna CTS Optimizer")
     
@@ -188,25 +1020,95 @@ def main():
     parser.add_argument("--source-dir", required=True, help="Reference directory for softlinks")
     
     # Storage
-    parser.add_argument("--db-type", choices=["sqlite", "postgres"], default="sqlite", help="Backend DB type")
-    parser.add_argument("--db-name", default="optuna_study.db", help="SQLite file or Postgres DB name")
+    parser.add_argument("--db-type", choices=["sqlite", "postgres", "journal"], default="sqlite", help="Backend DB type")
+    parser.add_argument("--db-name", default="optuna_study.db", help="SQLite file, Postgres DB name or journal file")
     parser.add_argument("--db-host", help="Postgres host")
     parser.add_argument("--db-user", help="Postgres user")
     parser.add_argument("--db-pass", help="Postgres password")
+    parser.add_argument("--db-pool-size", type=int, default=1, help="Postgres connections kept open per worker")
+    parser.add_argument("--db-max-overflow", type=int, default=4,
+                        help="Extra Postgres connections allowed during bursts (closed when returned)")
+    parser.add_argument("--db-pool-recycle", type=int, default=1800,
+                        help="Reopen pooled Postgres connections older than this many seconds")
+    parser.add_argument("--db-pool-pre-ping", action=argparse.BooleanOptionalAction, default=True,
+                        help="Check pooled Postgres connections before use (survives server-side idle kills)")
+    parser.add_argument("--db-release-idle", action="store_true",
+                        help="Hold no Postgres connection between storage calls (NullPool)")
+    parser.add_argument("--heartbeat-interval", type=int, default=60,
+                        help="Seconds between trial heartbeats (0 disables stale-trial reaping)")
+    parser.add_argument("--heartbeat-grace", type=int, default=600,
+                        help="Seconds without a heartbeat before a RUNNING trial is failed and retried")
+    parser.add_argument("--max-retry", type=int, default=2, help="Retries of a trial orphaned by a dead worker")
     
     # Optimization
     parser.add_argument("--study-name", default="cts_opt_study", help="Optuna study name")
     parser.add_argument("--trials", type=int, default=30, help="Number of trials for this worker")
+    parser.add_argument("--no-result-cache", action="store_true",
+                        help="Re-run cell sets that a completed trial already evaluated")
+    parser.add_argument("--concurrency", type=int, default=1, help="Trials kept in flight by this worker")
+    parser.add_argument("--adaptive-concurrency", action="store_true",
+                        help="Adjust in-flight trials between --min-concurrency and --concurrency from grid "
+                             "queue wait and turnaround (AIMD)")
+    parser.add_argument("--min-concurrency", type=int, default=1, help="Lower bound for --adaptive-concurrency")
+    parser.add_argument("--target-queue-wait", type=float, default=900.0,
+                        help="Queue wait (s) above which --adaptive-concurrency backs off")
     parser.add_argument("--run-prefix", default="opt", help="Prefix for run names")
+    parser.add_argument("--resume", action="store_true",
+                        help="First wait on (or collect) this prefix's RUNNING trials from a previous process")
+    parser.add_argument("--worker-id",
+                        help="Stable name of this worker; --resume adopts only trials recorded with it "
+                             "(default: trials of dead processes on this host)")
     parser.add_argument("--skew-limit", type=float, default=0.06, help="Skew constraint (ns)")
     parser.add_argument("--script", default="./run_flow_parameterized.sh", help="Path to flow script")
+    parser.add_argument("--cancel-script", default="./cancel_flow_parameterized.sh", help="Path to job cancel script")
+    parser.add_argument("--provision", choices=PROVISION_MODES, default="create",
+                        help="create: bob create + link + validate per trial; clone: copy a template run "
+                             "built once per study and drop in the trial's cell overrides")
+    parser.add_argument("--flow-driver", choices=FLOW_DRIVERS, default="shell",
+                        help="shell: one flow script per trial; python: one in-process Bob driver per worker "
+                             "with batched status queries; fake: the python driver against a simulated Bob; "
+                             "scheduler: hand runs to this host's flow_scheduler.py")
+    parser.add_argument("--scheduler-socket", default=DEFAULT_SOCKET, help="flow_scheduler.py socket")
+    parser.add_argument("--template-run", help="Template run name for --provision clone (default: <study-name>_template)")
+    parser.add_argument("--objective", choices=OBJECTIVE_MODES, default="penalty",
+                        help="penalty: latency + 100x skew violation; constrained: latency with skew as a "
+                             "sampler constraint; multi: (latency, skew) Pareto search with the same constraint")
+    parser.add_argument("--sampler", choices=["tpe", "nsga2"], default="tpe", help="Optuna sampler")
+    parser.add_argument("--parallel-sampling", action="store_true",
+                        help="Constant-liar TPE plus a claim on the cell-set hash of in-flight trials")
+    parser.add_argument("--pruner", choices=["none", "median"], default="none",
+                        help="Prune hopeless trials from live clock.log skew rows")
+    parser.add_argument("--tail-interval", type=float, default=60.0,
+                        help="Seconds between log reads when pruning or watching for fatal patterns")
+    parser.add_argument("--fatal-watch", action="store_true",
+                        help="Kill jobs whose logs match a fatal/known-bad pattern and fail or prune the trial")
+    parser.add_argument("--fatal-patterns", help="JSON pattern table merged over the defaults (implies --fatal-watch)")
+    parser.add_argument("--metrics-jsonl", help="Append one JSON event per trial phase span to this file")
+    parser.add_argument("--metrics-prom", help="Keep per-phase totals in this Prometheus textfile (node_exporter)")
+    parser.add_argument("--surrogate-gate", action="store_true",
+                        help="Skip candidates a model trained on completed trials predicts to score poorly")
+    parser.add_argument("--gate-min-trials", type=int, default=20,
+                        help="Completed trials needed before the surrogate gate starts rejecting")
+    parser.add_argument("--gate-quantile", type=float, default=0.75,
+                        help="Reject candidates predicted worse than this quantile of completed scores")
+    parser.add_argument("--gate-epsilon", type=float, default=0.1,
+                        help="Share of would-be rejections launched anyway to check the gate")
     parser.add_argument("--vts", nargs="+", default=["ULVT"], help="VT types to explore")
+    parser.add_argument("--gc", choices=("none",) + workspace_gc.GC_ACTIONS, default="none",
+                        help="Archive or delete run directories outside the retention policy as trials finish")
+    workspace_gc.add_policy_args(parser, prefix="gc-")
+    parser.add_argument("--search-space", choices=["drive-range", "cell-set"], default="drive-range",
+                        help="Suggest integer drive ranges, or min/max indices into the drive strengths that exist per VT")
 
     args = parser.parse_args()
+    if args.objective == "multi" and args.pruner != "none":
+        parser.error("--pruner is not supported with --objective multi")
 
     # Construct Storage URL
     if args.db_type == "sqlite":
         storage_url = f"sqlite:///{args.db_name}"
+    elif args.db_type == "journal":
+        storage_url = args.db_name
     else:
         pw = urllib.parse.quote_plus(args.db_pass) if args.db_pass else ""
         storage_url = f"postgresql://{args.db_user}:{pw}@{args.db_host}/{args.db_name}"
@@ -224,20 +1126,81 @@ def main():
         storage_url=storage_url,
         vt_types=args.vts,
         min_drive_range=(1, 8),
-        max_drive_range=(1, 16)
+        max_drive_range=(1, 16),
+        concurrency=max(1, args.concurrency),
+        cancel_script_path=args.cancel_script,
+        prune=args.pruner != "none",
+        tail_interval=args.tail_interval,
+        result_cache=not args.no_result_cache,
+        search_space=args.search_space,
+        objective_mode=args.objective,
+        sampler=args.sampler,
+        parallel_sampling=args.parallel_sampling,
+        # Journal storage has no heartbeats, so no stale-trial reaping either
+        heartbeat_interval=args.heartbeat_interval if args.db_type != "journal" else 0,
+        heartbeat_grace=args.heartbeat_grace,
+        max_retry=args.max_retry,
+        db_type=args.db_type,
+        engine_kwargs=postgres_engine_kwargs(
+            args.db_pool_size, args.db_max_overflow, args.db_pool_recycle,
+            args.db_pool_pre_ping, args.db_release_idle
+        ) if args.db_type == "postgres" else None,
+        provision=args.provision,
+        template_run=args.template_run,
+        flow_driver=args.flow_driver,
+        scheduler_socket=args.scheduler_socket,
+        adaptive_concurrency=args.adaptive_concurrency,
+        min_concurrency=max(1, min(args.min_concurrency, args.concurrency)),
+        target_queue_wait=args.target_queue_wait,
+        fatal_patterns=(load_fatal_patterns(args.fatal_patterns) if args.fatal_patterns
+                        else DEFAULT_FATAL_PATTERNS if args.fatal_watch else None),
+        metrics_jsonl=args.metrics_jsonl,
+        metrics_prom=args.metrics_prom,
+        worker_id=args.worker_id,
+        surrogate_gate=args.surrogate_gate,
+        gate_min_trials=max(2, args.gate_min_trials),
+        gate_quantile=args.gate_quantile,
+        gate_epsilon=args.gate_epsilon
     )
 
     objective = CTSObjective(config)
+    pruner = optuna.pruners.MedianPruner(n_startup_trials=5) if config.prune else optuna.pruners.NopPruner()
     
+    storage = optuna.storages.get_storage(create_storage(config))
     study = optuna.create_study(
         study_name=config.study_name,
-        storage=config.storage_url,
+        storage=storage,
+        sampler=create_sampler(config, objective),
+        pruner=pruner,
         load_if_exists=True,
-        direction="minimize"
+        directions=["minimize", "minimize"] if config.objective_mode == 'multi' else ["minimize"]
     )
     
     logger.info(f"Connected to study '{config.study_name}' via {args.db_type}")
-    study.optimize(objective, n_trials=config.trials)
+    if config.heartbeat_interval > 0:
+        # Reap trials orphaned by workers that died since the study was last used;
+        # study.optimize and the concurrent heartbeat thread keep doing it as they run
+        optuna.storages.fail_stale_trials(study)
+    callbacks = []
+    if args.gc != "none":
+        policy = workspace_gc.policy_from_args(args, args.gc, prefix="gc-")
+        callbacks.append(workspace_gc.WorkspaceGC(config.wa_name, policy, config.results_dir))
+
+    resumed = find_resumable_trials(study, storage, config.run_prefix, config.worker_id) if args.resume else []
+    if resumed:
+        logger.info(f"Resuming {len(resumed)} in-flight trials: {[t.number for t in resumed]}")
+    if config.concurrency > 1:
+        throttle = ConcurrencyThrottle(config.min_concurrency, config.concurrency,
+                                       config.target_queue_wait) if config.adaptive_concurrency else None
+        run_concurrent(study, objective, config.trials, config.concurrency, config.heartbeat_interval, resumed,
+                       callbacks, throttle)
+    else:
+        if resumed:
+            run_concurrent(study, objective, 0, 1, config.heartbeat_interval, resumed, callbacks)
+        budget = TrialBudget(config.trials)
+        if not budget.exhausted:
+            study.optimize(objective, callbacks=callbacks + [budget], catch=(FlowAborted,))
+    log_best(study, config)
 
 if __name__ == "__main__":
     main()
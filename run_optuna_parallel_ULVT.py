@@ -1,12 +1,15 @@
 import optuna
 import os
 import subprocess
-import re
 import logging
 import sys
 import urllib.parse
 import argparse
 
+import cts_log_parser
+from flow_scheduler import SchedulerClient
+from cell_catalog import BUFFER, CLOCK_INVERTER, CellCatalog, cell_set_hash, load_cell_list
+
 # --- DEFAULT CONFIGURATION (Overridden by CLI args) ---
 SCRIPT_PATH = './run_flow.sh'
 WA_NAME = '20260114_gcpu_smu_svd_pipe'
@@ -15,6 +18,11 @@ STUDY_NAME = "gcpu_smu_svd_pipe_no_INVD_parallel_v1"
 RUN_PREFIX = "optuna_run"  # Prefix for generated run_names
 BLOCK_NAME = "gcpu_smu_svd_pipe" # Default block name
 SOURCE_DIR_BASE = "/path/to/source/parent" # Default source path
+SCHEDULER = None  # SchedulerClient when --scheduler-socket is given
+# penalty: latency + 100x skew violation; constrained: latency with skew as a sampler
+# constraint; multi: (latency, skew) Pareto search with the same constraint
+OBJECTIVE_MODES = ('penalty', 'constrained', 'multi')
+OBJECTIVE_MODE = 'penalty'
 
 STORAGE_URL = "sqlite:///gcpu_lcu_v5_study.db"
 
@@ -26,36 +34,10 @@ USABLE_INVERTERS_FILE = 'usable_inverters.list'
 USABLE_BUFFERS_FILE = 'usable_buffers.list'
 
 
-def load_cells_from_file(filepath):
-    """Loads a list of cells from a file, one cell per line."""
-    if not os.path.exists(filepath):
-        # We don't exit here immediately to allow --help to run even if files are missing
-        return []
-    with open(filepath, 'r') as f:
-        return [line.strip() for line in f if line.strip()]
-
-# Load lists globally
-FULL_INVERTER_LIST = load_cells_from_file(USABLE_INVERTERS_FILE)
-FULL_BUFFER_LIST = load_cells_from_file(USABLE_BUFFERS_FILE)
-
-
-def filter_cells_by_criteria(full_cell_list, vt_choice, min_drive, max_drive):
-    """Filters cells based on VT type and drive strength."""
-    selected_cells = []
-    drive_strength_pattern = re.compile(r'D(\d+P\d+|\d+)')
-
-    for cell in full_cell_list:
-        if vt_choice in cell:
-            match = drive_strength_pattern.search(cell)
-            if match:
-                try:
-                    strength_str = match.group(1)
-                    strength = float(strength_str.replace('P', '.'))
-                    if min_drive <= strength <= max_drive:
-                        selected_cells.append(cell)
-                except (ValueError, IndexError):
-                    continue
-    return selected_cells
+# Load lists globally and index them once by (class, VT, drive strength)
+FULL_INVERTER_LIST = load_cell_list(USABLE_INVERTERS_FILE)
+FULL_BUFFER_LIST = load_cell_list(USABLE_BUFFERS_FILE)
+CELL_CATALOG = CellCatalog.from_lists(FULL_BUFFER_LIST, FULL_INVERTER_LIST)
 
 
 def parse_clock_log(filepath):
@@ -64,41 +46,8 @@ def parse_clock_log(filepath):
     Tracks the maximum skew found to avoid grabbing 'early' corners or minor groups.
     Returns a tuple (max_latency, skew) or None if not found.
     """
-    max_skew_found = -1.0
-    associated_latency = -1.0
-    found_valid_data = False
-    
     try:
-        with open(filepath, 'r') as f:
-            for line in f:
-                # Identify the row by checking for key identifiers
-                if "ssgnp_" in line and "CLK/" in line:
-                    parts = line.split()
-                    try:
-                        # Find exactly where the data starts to handle timestamps robustly
-                        base_idx = next(i for i, part in enumerate(parts) if part.startswith("ssgnp_"))
-                        
-                        # base_idx + 0 = Half-corner
-                        # base_idx + 1 = Skew Group
-                        # base_idx + 2 = Min ID
-                        # base_idx + 3 = Max ID (Latency)
-                        # base_idx + 4 = Skew
-                        
-                        max_latency = float(parts[base_idx + 3])
-                        skew = float(parts[base_idx + 4])
-                        
-                        # Keep the maximum skew found across all corners/groups
-                        if skew > max_skew_found:
-                            max_skew_found = skew
-                            associated_latency = max_latency
-                            found_valid_data = True
-                            
-                    except (IndexError, ValueError, StopIteration):
-                        continue
-                        
-        if found_valid_data:
-            return associated_latency, max_skew_found
-            
+        return cts_log_parser.parse_clock_log(filepath).worst()
     except Exception as e:
         print(f"  [!] Error reading {filepath}: {e}")
         
@@ -109,6 +58,17 @@ def parse_clock_log(filepath):
 optuna.logging.set_verbosity(optuna.logging.INFO)
 
 
+def failed_value():
+    """Objective value of a trial without timing data."""
+    return (float('inf'), float('inf')) if OBJECTIVE_MODE == 'multi' else float('inf')
+
+
+def skew_constraint(trial):
+    """Skew constraint for the sampler's constraints_func: feasible when <= 0."""
+    skew = trial.user_attrs.get('skew')
+    return (float('inf'),) if skew is None else (skew - SKEW_CONSTRAINT,)
+
+
 def objective(trial):
     """The main objective function."""
     # Access globals set by argparse
@@ -129,26 +89,30 @@ def objective(trial):
     # Read base config
     if not os.path.exists(BASE_VAR_FILE):
         print(f"FATAL: Base var file not found at {BASE_VAR_FILE}")
-        return float('inf')
+        return failed_value()
 
     with open(BASE_VAR_FILE, 'r') as f:
         base_var_content = f.read()
 
     # --- Cell Filtering Logic ---
-    selected_buffers = filter_cells_by_criteria(FULL_BUFFER_LIST, vt_choice, min_drive, max_drive)
-    inverters_to_ban = [c for c in FULL_INVERTER_LIST if c.startswith('INV')]
-    clock_inverter_candidates = [c for c in FULL_INVERTER_LIST if not c.startswith('INV')]
-    selected_inverters = filter_cells_by_criteria(clock_inverter_candidates, vt_choice, min_drive, max_drive)
+    selected_buffers = CELL_CATALOG.select(BUFFER, vt_choice, min_drive, max_drive)
+    selected_inverters = CELL_CATALOG.select(CLOCK_INVERTER, vt_choice, min_drive, max_drive)
 
     # --- Failsafe ---
     MIN_CELL_COUNT = 6
     if len(selected_inverters) < MIN_CELL_COUNT:
-        failsafe = [c for c in clock_inverter_candidates if vt_choice in c]
+        failsafe = CELL_CATALOG.cells(CLOCK_INVERTER, vt_choice)
         selected_inverters = failsafe[:MIN_CELL_COUNT]
     if len(selected_buffers) < MIN_CELL_COUNT:
-        failsafe = [c for c in FULL_BUFFER_LIST if vt_choice in c]
+        failsafe = CELL_CATALOG.cells(BUFFER, vt_choice)
         selected_buffers = failsafe[:MIN_CELL_COUNT]
 
+    # --- Per-trial metrics kept in the study for analysis ---
+    trial.set_user_attr('run_name', run_name)
+    trial.set_user_attr('cell_set_hash', cell_set_hash(base_var_content, selected_inverters, selected_buffers))
+    trial.set_user_attr('n_buffers', len(selected_buffers))
+    trial.set_user_attr('n_inverters', len(selected_inverters))
+
     buffers_str = " ".join(selected_buffers)
     allowed_inverters_str = " ".join(selected_inverters)
 
@@ -172,23 +136,28 @@ bbappend pnr.innovus.ClockBuildClockTreePreCallback {{
     
 # --- Execute Bash Script ---
     job_marked_failed = False
-    try:
-        with open(log_file_path, 'w') as log_file:
-            subprocess.run(
-                [
-                    SCRIPT_PATH, 
-                    run_name, 
-                    "../../" + var_file_name, 
-                    WA_NAME, 
-                    BLOCK_NAME, 
-                    SOURCE_DIR_BASE
-                ], 
-                check=True, universal_newlines=True,
-                stdout=log_file, stderr=subprocess.STDOUT
-            )
-    except subprocess.CalledProcessError:
-        print(f"[!] Bash script exited with FAILED status for {run_name}. Checking for clock.log anyway...")
-        job_marked_failed = True
+    if SCHEDULER is not None:
+        job_marked_failed = SCHEDULER.start(run_name, "../../" + var_file_name, log_file_path).wait() != 0
+        if job_marked_failed:
+            print(f"[!] Flow ended with FAILED status for {run_name}. Checking for clock.log anyway...")
+    else:
+        try:
+            with open(log_file_path, 'w') as log_file:
+                subprocess.run(
+                    [
+                        SCRIPT_PATH, 
+                        run_name, 
+                        "../../" + var_file_name, 
+                        WA_NAME, 
+                        BLOCK_NAME, 
+                        SOURCE_DIR_BASE
+                    ], 
+                    check=True, universal_newlines=True,
+                    stdout=log_file, stderr=subprocess.STDOUT
+                )
+        except subprocess.CalledProcessError:
+            print(f"[!] Bash script exited with FAILED status for {run_name}. Checking for clock.log anyway...")
+            job_marked_failed = True
 
     # --- Parse Results (The Salvage Operation) ---
     log_file_path_for_parsing = os.path.join(WA_NAME, 'run', run_name, 'main', 'pnr', 'clock', 'logs', 'clock.log')
@@ -196,20 +165,27 @@ bbappend pnr.innovus.ClockBuildClockTreePreCallback {{
     # First, actually check if the file exists before parsing
     if not os.path.exists(log_file_path_for_parsing):
         print(f"Trial {trial_num} completely failed: clock.log was never generated.")
-        return float('inf')
+        return failed_value()
 
     max_latency, skew = parse_clock_log(log_file_path_for_parsing)
 
     # If parsing fails to find the target strings
     if max_latency is None or skew is None:
         print(f"Trial {trial_num} completely failed: clock.log exists but timing data is incomplete/missing.")
-        return float('inf')
+        return failed_value()
 
     # If we made it here, we successfully salvaged the data!
     if job_marked_failed:
         print(f"--> SALVAGE SUCCESSFUL! Extracted Latency ({max_latency}) and Skew ({skew}) from a FAILED run.")
 
+    trial.set_user_attr('latency', max_latency)
+    trial.set_user_attr('skew', skew)
+
     # --- Objective Calculation ---
+    if OBJECTIVE_MODE == 'multi':
+        return max_latency, skew
+    if OBJECTIVE_MODE == 'constrained':
+        return max_latency
     objective_value = max_latency 
     if skew > SKEW_CONSTRAINT:
         penalty = (skew - SKEW_CONSTRAINT) * 100
@@ -232,10 +208,14 @@ if __name__ == "__main__":
     parser.add_argument("--script-path", default=SCRIPT_PATH, help="Path to run_flow.sh")
     parser.add_argument("--block-name", default=BLOCK_NAME, help="Block name (e.g. gcpu_smu_svd_pipe)")
     parser.add_argument("--source-dir", default=SOURCE_DIR_BASE, help="Source directory base")
+    parser.add_argument("--scheduler-socket", help="Submit runs to this host's flow_scheduler.py instead of running the script")
     
     # Optimization Parameters
     parser.add_argument("--trials", type=int, default=30, help="Number of trials")
     parser.add_argument("--skew-constraint", type=float, default=0.06, help="Skew constraint in ns")
+    parser.add_argument("--objective", choices=OBJECTIVE_MODES, default="penalty",
+                        help="penalty: latency + 100x skew violation; constrained: latency with skew as a "
+                             "sampler constraint; multi: (latency, skew) Pareto search with the same constraint")
 
     args = parser.parse_args()
 
@@ -248,6 +228,9 @@ if __name__ == "__main__":
     BLOCK_NAME = args.block_name
     SOURCE_DIR_BASE = args.source_dir
     SKEW_CONSTRAINT = args.skew_constraint
+    OBJECTIVE_MODE = args.objective
+    if args.scheduler_socket:
+        SCHEDULER = SchedulerClient(WA_NAME, BLOCK_NAME, SOURCE_DIR_BASE, args.scheduler_socket)
 
     # --- Validation ---
     if not FULL_INVERTER_LIST or not FULL_BUFFER_LIST:
@@ -260,8 +243,9 @@ if __name__ == "__main__":
     study = optuna.create_study(
         study_name=STUDY_NAME,
         storage=STORAGE_URL,
+        sampler=optuna.samplers.TPESampler(constraints_func=skew_constraint if OBJECTIVE_MODE != 'penalty' else None),
         load_if_exists=True,
-        direction="minimize"
+        directions=["minimize", "minimize"] if OBJECTIVE_MODE == 'multi' else ["minimize"]
     )
     
     study.optimize(objective, n_trials=args.trials)
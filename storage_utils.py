@@ -0,0 +1,48 @@
+"""
+Optuna storage factories shared by the optimizers and the study tools
+(plot_results.py, migrate_study.py, workspace_gc.py).
+"""
+
+from typing import Any, Dict, Optional
+
+import optuna
+
+
+def create_journal_storage(path: str) -> optuna.storages.BaseStorage:
+    """
+    Append-only journal file storage for studies on a shared filesystem, without a
+    DB server. The open(O_EXCL) lock works on NFS, unlike SQLite's file locks.
+    """
+    try:
+        from optuna.storages.journal import JournalFileBackend, JournalFileOpenLock
+    except ImportError:  # Optuna < 4.0
+        from optuna.storages import JournalFileOpenLock, JournalFileStorage as JournalFileBackend
+    return optuna.storages.JournalStorage(JournalFileBackend(path, lock_obj=JournalFileOpenLock(path)))
+
+def create_rdb_storage(url: str, engine_kwargs: Optional[Dict[str, Any]] = None, heartbeat_interval: int = 0,
+                       heartbeat_grace: Optional[int] = None, max_retry: int = 0) -> optuna.storages.RDBStorage:
+    """
+    RDB storage with an optional connection pool and trial heartbeats: trials whose
+    worker stops heartbeating for `heartbeat_grace` seconds are failed and re-enqueued
+    with the same parameters (up to `max_retry` times).
+    """
+    retry = {}
+    if heartbeat_interval > 0:
+        if hasattr(optuna.storages, 'RetryHeartbeatStaleTrialCallback'):
+            # Optuna >= 4.9 renamed the callback and its storage argument
+            retry = {'heartbeat_stale_trial_callback': optuna.storages.RetryHeartbeatStaleTrialCallback(max_retry=max_retry)}
+        else:
+            retry = {'failed_trial_callback': optuna.storages.RetryFailedTrialCallback(max_retry=max_retry)}
+    return optuna.storages.RDBStorage(
+        url,
+        engine_kwargs=engine_kwargs or {},
+        heartbeat_interval=heartbeat_interval or None,
+        grace_period=heartbeat_grace if heartbeat_interval > 0 else None,
+        **retry
+    )
+
+def open_storage(url: str) -> optuna.storages.BaseStorage:
+    """RDB storage for database URLs; anything without '://' is a journal file path."""
+    if "://" in url:
+        return create_rdb_storage(url)
+    return create_journal_storage(url)
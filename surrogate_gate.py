@@ -0,0 +1,181 @@
+"""
+Surrogate Gate
+Cheap pre-screen in front of the flow: a regression model trained on completed trials
+predicts a candidate's score from its cell-set features (VT, drive range, cell counts,
+mean drive strength). Candidates predicted worse than a quantile of the scores seen so
+far are rejected before any grid time is spent, except for a random `epsilon` share
+that is launched anyway so the gate's rejections can be checked against real results.
+Uses gradient-boosted trees when scikit-learn is installed, otherwise a numpy k-nearest
+neighbours regressor.
+"""
+
+import logging
+import random
+import threading
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import optuna
+from optuna.trial import FrozenTrial, TrialState
+
+from cell_catalog import CellCatalog
+
+try:
+    from sklearn.ensemble import GradientBoostingRegressor
+except ImportError:  # Optional: falls back to KNNRegressor
+    GradientBoostingRegressor = None
+
+logger = logging.getLogger(__name__)
+
+# Study user attribute holding the gate's running accuracy
+ACCURACY_ATTR = 'surrogate_gate'
+
+class KNNRegressor:
+    """Inverse-distance weighted k-nearest neighbours on standardized features."""
+    def __init__(self, k: int = 5):
+        self.k = k
+
+    def fit(self, X: np.ndarray, y: np.ndarray) -> 'KNNRegressor':
+        self.mean = X.mean(axis=0)
+        self.scale = X.std(axis=0)
+        self.scale[self.scale == 0] = 1.0
+        self.X = (X - self.mean) / self.scale
+        self.y = y
+        return self
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        Z = (X - self.mean) / self.scale
+        dist = np.linalg.norm(Z[:, None, :] - self.X[None, :, :], axis=2)
+        k = min(self.k, len(self.y))
+        nearest = np.argsort(dist, axis=1)[:, :k]
+        weights = 1.0 / (np.take_along_axis(dist, nearest, axis=1) + 1e-6)
+        return (weights * self.y[nearest]).sum(axis=1) / weights.sum(axis=1)
+
+def cell_set_features(vt: str, min_drive: float, max_drive: float, buffers: Sequence[str],
+                      inverters: Sequence[str], catalog: CellCatalog) -> Dict[str, float]:
+    """Numeric description of a candidate's final cell set (VT is one-hot encoded by the gate)."""
+    drives = [catalog.cells_by_name[name].drive for name in list(buffers) + list(inverters)
+              if name in catalog.cells_by_name]
+    return {
+        'min_drive': float(min_drive),
+        'max_drive': float(max_drive),
+        'drive_span': float(max_drive - min_drive),
+        'n_buffers': float(len(buffers)),
+        'n_inverters': float(len(inverters)),
+        'mean_drive': float(np.mean(drives)) if drives else 0.0,
+    }
+
+class SurrogateGate:
+    """
+    Decides whether a candidate is worth launching. `score` maps a completed trial to
+    the scalar being minimized (None to skip it). `trial_features` maps a completed
+    trial to its (VT, features) (None if unknown), so trials that ran before the gate
+    was enabled are used too; trials the gate saw carry them as `gate_features`. The
+    model is refit whenever the set of completed, featured trials has grown.
+    """
+    FEATURES = ['min_drive', 'max_drive', 'drive_span', 'n_buffers', 'n_inverters', 'mean_drive']
+
+    def __init__(self, vt_types: Sequence[str], score: Callable[[FrozenTrial], Optional[float]],
+                 trial_features: Optional[Callable[[FrozenTrial], Optional[Tuple[str, Dict[str, float]]]]] = None,
+                 min_trials: int = 20, quantile: float = 0.75, epsilon: float = 0.1, seed: Optional[int] = None):
+        self.vt_types = list(vt_types)
+        self.score = score
+        self.trial_features = trial_features
+        self._derived: Dict[int, Optional[Dict[str, float]]] = {}  # Trial number -> derived features
+        self.min_trials = min_trials
+        self.quantile = quantile
+        self.epsilon = epsilon
+        self.rng = random.Random(seed)
+        self._model = None
+        self._threshold = float('inf')
+        self._n_trained = 0
+        self._lock = threading.Lock()
+
+    def _vector(self, vt: str, features: Dict[str, float]) -> List[float]:
+        return [features[name] for name in self.FEATURES] + [float(vt == v) for v in self.vt_types]
+
+    def _training_set(self, study: optuna.Study):
+        rows, targets, checked = [], [], []
+        for t in study.get_trials(deepcopy=False, states=(TrialState.COMPLETE,)):
+            if 'cache_hit_of' in t.user_attrs:
+                continue  # Same cell set and score as the trial it reused
+            features, score = t.user_attrs.get('gate_features') or self._derive(t), self.score(t)
+            if features is None or score is None or not np.isfinite(score):
+                continue
+            rows.append(self._vector(features['vt'], features))
+            targets.append(score)
+            if 'gate_prediction' in t.user_attrs:
+                checked.append((t.user_attrs['gate_prediction'], t.user_attrs['gate_threshold'], score,
+                                t.user_attrs.get('gate_passthrough', False)))
+        return np.array(rows), np.array(targets), checked
+
+    def _derive(self, trial: FrozenTrial) -> Optional[Dict[str, float]]:
+        if self.trial_features is None:
+            return None
+        if trial.number not in self._derived:
+            derived = self.trial_features(trial)
+            self._derived[trial.number] = dict(derived[1], vt=derived[0]) if derived else None
+        return self._derived[trial.number]
+
+    def _refit(self, study: optuna.Study):
+        X, y, checked = self._training_set(study)
+        if len(y) < self.min_trials or len(y) == self._n_trained:
+            return
+        model = GradientBoostingRegressor(n_estimators=100, max_depth=3) if GradientBoostingRegressor else KNNRegressor()
+        self._model = model.fit(X, y)
+        self._threshold = float(np.quantile(y, self.quantile))
+        self._n_trained = len(y)
+        self._record_accuracy(study, checked)
+
+    def _record_accuracy(self, study: optuna.Study, checked: List[tuple]):
+        """
+        Stores how well past predictions matched the real scores: mean absolute error,
+        how often predicted and real scores fell on the same side of the threshold in
+        force at the time, and, for launched would-be rejections, how many really were
+        worse than it.
+        """
+        if not checked:
+            return
+        predicted, threshold, actual, passthrough = (np.array(column) for column in zip(*checked))
+        rejected = passthrough.astype(bool)
+        n_rejected = sum(1 for t in study.get_trials(deepcopy=False, states=(TrialState.PRUNED,))
+                         if t.user_attrs.get('gate_rejected'))
+        accuracy = {
+            'model': 'gbrt' if GradientBoostingRegressor else 'knn',
+            'n_trained': self._n_trained,
+            'n_checked': len(actual),
+            'mae': round(float(np.abs(predicted - actual).mean()), 4),
+            'agreement': round(float(((predicted > threshold) == (actual > threshold)).mean()), 3),
+            'n_rejected': n_rejected,
+            'n_passthrough': int(rejected.sum()),
+            'reject_precision': round(float((actual[rejected] > threshold[rejected]).mean()), 3) if rejected.any() else None,
+        }
+        study.set_user_attr(ACCURACY_ATTR, accuracy)
+        logger.info(f"Surrogate gate: {accuracy}")
+
+    def screen(self, trial: optuna.Trial, vt: str, features: Dict[str, float]) -> bool:
+        """
+        Records the candidate's features and the model's prediction on the trial and
+        returns False if it should not be launched.
+        """
+        trial.set_user_attr('gate_features', dict(features, vt=vt))
+        with self._lock:
+            self._refit(trial.study)
+            model, threshold = self._model, self._threshold
+        if model is None:
+            return True
+
+        predicted = float(model.predict(np.array([self._vector(vt, features)]))[0])
+        trial.set_user_attr('gate_prediction', round(predicted, 4))
+        trial.set_user_attr('gate_threshold', round(threshold, 4))
+        if predicted <= threshold:
+            return True
+        if self.rng.random() < self.epsilon:
+            trial.set_user_attr('gate_passthrough', True)
+            logger.info(f"Trial {trial.number}: predicted score {predicted:.4f} > {threshold:.4f}, launching anyway "
+                        f"(gate check)")
+            return True
+        trial.set_user_attr('gate_rejected', True)
+        logger.info(f"Trial {trial.number}: rejected by the surrogate gate (predicted score {predicted:.4f} > "
+                    f"{threshold:.4f}, the {self.quantile:.0%} quantile of {self._n_trained} completed trials)")
+        return False
@@ -0,0 +1,196 @@
+import os
+import threading
+import time
+
+import pytest
+
+from bob_driver import (EXIT_FAILED, EXIT_INVALID, EXIT_NOT_FOUND, EXIT_VALID, TEMPLATE_MARKER, CommandBackend,
+                        FakeBobBackend, FlowDriver)
+
+TIMEOUT = 10
+
+class BrokenInfoBackend(FakeBobBackend):
+    """Fake Bob whose `bob info` always fails, like an unreachable VOV server."""
+    def run(self, args, cwd):
+        if args[1] == 'info':
+            with self._lock:
+                self.calls['info'] = self.calls.get('info', 0) + 1
+            return 1, "vovserver not responding"
+        return super().run(args, cwd)
+
+class FailingBackend(FakeBobBackend):
+    """Fake Bob whose given verbs exit non-zero the first `times` calls."""
+    def __init__(self, verbs, times=1, **kwargs):
+        super().__init__(**kwargs)
+        self.failing = {verb: times for verb in verbs}
+
+    def run(self, args, cwd):
+        verb = args[1]
+        if self.failing.get(verb, 0) > 0:
+            with self._lock:
+                self.failing[verb] -= 1
+                self.calls[verb] = self.calls.get(verb, 0) + 1
+            return 1, f"bob {verb}: error"
+        return super().run(args, cwd)
+
+@pytest.fixture
+def workspace(tmp_path):
+    os.makedirs(tmp_path / 'wa' / 'run')
+    os.makedirs(tmp_path / 'logs')
+    return tmp_path
+
+@pytest.fixture
+def make_driver(workspace):
+    drivers = []
+
+    def make(backend, **kwargs):
+        kwargs.setdefault('poll_min', 0.05)
+        kwargs.setdefault('poll_max', 0.2)
+        driver = FlowDriver(backend, str(workspace / 'wa'), 'blk', str(workspace / 'source'), **kwargs)
+        drivers.append(driver)
+        return driver
+
+    yield make
+    for driver in drivers:
+        driver.close()
+
+def start(driver, workspace, name, **kwargs):
+    return driver.start(name, f"vars_{name}.var", str(workspace / 'logs' / f"{name}.log"), **kwargs)
+
+def quick_backend(**kwargs):
+    return FakeBobBackend(queue_time=(0.0, 0.0), run_time=(0.05, 0.1), seed=0, **kwargs)
+
+def test_command_backend_is_abstract():
+    with pytest.raises(TypeError):
+        CommandBackend()
+
+def test_valid_run_writes_clock_log(workspace, make_driver):
+    driver = make_driver(quick_backend())
+    run = start(driver, workspace, 'ok')
+
+    assert run.wait(TIMEOUT) == EXIT_VALID
+    assert os.path.exists(workspace / 'wa' / 'run' / 'ok' / 'main' / 'pnr' / 'clock' / 'logs' / 'clock.log')
+    assert run.created_at <= run.submitted_at <= run.finished_at
+    assert "FLOW_STATUS: VALID" in (workspace / 'logs' / 'ok.log').read_text()
+
+def test_failed_run(workspace, make_driver):
+    driver = make_driver(quick_backend(fail_rate=1.0))
+    run = start(driver, workspace, 'bad')
+
+    assert run.wait(TIMEOUT) == EXIT_FAILED
+
+def test_invalid_run_is_resubmitted_until_retries_run_out(workspace, make_driver):
+    backend = quick_backend(invalid_rate=1.0)
+    driver = make_driver(backend, max_retries=2)
+    run = start(driver, workspace, 'flaky')
+
+    assert run.wait(TIMEOUT) == EXIT_INVALID
+    assert run.retries == 3
+    assert backend.calls['run'] == 3  # First submission plus two forced resubmissions
+
+def test_attach_without_run_dir_is_not_found(workspace, make_driver):
+    backend = quick_backend()
+    driver = make_driver(backend)
+    run = start(driver, workspace, 'missing', attach=True)
+
+    assert run.done.is_set()
+    assert run.returncode == EXIT_NOT_FOUND
+    assert 'info' not in backend.calls
+
+def test_attach_without_clock_job_is_not_found(workspace, make_driver):
+    os.makedirs(workspace / 'wa' / 'run' / 'never_submitted')
+    driver = make_driver(quick_backend())
+    run = start(driver, workspace, 'never_submitted', attach=True)
+
+    assert run.wait(TIMEOUT) == EXIT_NOT_FOUND
+
+def test_attach_to_submitted_run(workspace, make_driver):
+    backend = quick_backend()
+    first = make_driver(backend)
+    start(first, workspace, 'resumed')
+    second = make_driver(backend)  # e.g. a restarted worker
+    run = start(second, workspace, 'resumed', attach=True)
+
+    assert run.wait(TIMEOUT) == EXIT_VALID
+
+def test_cancel_racing_the_poller_finishes_once(workspace, make_driver):
+    driver = make_driver(FakeBobBackend(queue_time=(0.0, 0.0), run_time=(0.0, 0.02), seed=1), poll_min=0.01)
+    finished = {}
+    lock = threading.Lock()
+
+    def on_done(run):
+        with lock:
+            finished[run.run_name] = finished.get(run.run_name, 0) + 1
+
+    runs = [start(driver, workspace, f"race_{i}", on_done=on_done) for i in range(20)]
+    for i, run in enumerate(runs):
+        time.sleep(0.002 * (i % 5))
+        driver.cancel(run)
+
+    for run in runs:
+        assert run.wait(TIMEOUT) in (EXIT_VALID, EXIT_FAILED)
+    assert finished == {run.run_name: 1 for run in runs}
+
+def test_cancel_stops_the_clock_job(workspace, make_driver):
+    backend = FakeBobBackend(queue_time=(0.0, 0.0), run_time=(60.0, 60.0))
+    driver = make_driver(backend)
+    run = start(driver, workspace, 'long')
+
+    driver.cancel(run)
+
+    assert run.returncode == EXIT_FAILED
+    assert backend.calls['stop'] == 1
+
+def test_failing_bob_info_backs_off(workspace, make_driver):
+    backend = BrokenInfoBackend()
+    driver = make_driver(backend, poll_min=0.1, poll_max=0.4)
+    run = start(driver, workspace, 'unreachable')
+    os.makedirs(workspace / 'wa' / 'run' / 'attached')
+    attached = start(driver, workspace, 'attached', attach=True)
+
+    time.sleep(1.0)
+
+    # Immediate queries for the two new runs, then 0.2 s, 0.4 s, 0.4 s, ... apart
+    assert backend.calls['info'] <= 6
+    # A failed query is not an empty status: the attached run is not written off
+    assert not run.done.is_set()
+    assert not attached.done.is_set()
+    driver.cancel(run)
+    driver.cancel(attached)
+
+def test_run_can_be_created_again(workspace, make_driver):
+    driver = make_driver(quick_backend())
+    assert start(driver, workspace, 'again').wait(TIMEOUT) == EXIT_VALID
+
+    # e.g. a resumed trial whose Bob job was lost is started from scratch in the same directory
+    assert start(driver, workspace, 'again').wait(TIMEOUT) == EXIT_VALID
+
+def test_failed_create_fails_the_run(workspace, make_driver):
+    backend = FailingBackend(['create'], queue_time=(0.0, 0.0), run_time=(0.05, 0.1))
+    driver = make_driver(backend)
+    run = start(driver, workspace, 'broken')
+
+    assert run.done.is_set()
+    assert run.returncode == EXIT_FAILED
+    assert 'run' not in backend.calls
+    assert not os.path.exists(workspace / 'wa' / 'run' / 'broken')
+
+def test_failed_template_build_is_not_cloned(workspace, make_driver):
+    backend = FailingBackend(['update'], queue_time=(0.0, 0.0), run_time=(0.05, 0.1))
+    driver = make_driver(backend)
+    (workspace / 'template.var').write_text('')
+    (workspace / 'overrides.tcl').write_text('')
+
+    def clone(name):
+        return start(driver, workspace, name, template_run='tmpl', template_var=str(workspace / 'template.var'),
+                     overrides_tcl=str(workspace / 'overrides.tcl'))
+
+    first = clone('first')
+    assert first.returncode == EXIT_FAILED
+    assert not os.path.exists(workspace / 'wa' / 'run' / 'tmpl')
+
+    # The next trial builds the template again instead of copying the broken one
+    second = clone('second')
+    assert second.wait(TIMEOUT) == EXIT_VALID
+    assert os.path.exists(workspace / 'wa' / 'run' / 'tmpl' / TEMPLATE_MARKER)
+    assert backend.calls['create'] == 2
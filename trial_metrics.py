@@ -0,0 +1,103 @@
+"""
+Trial Metrics
+Wall-clock phase spans of a trial (var-file generation, provisioning, queue wait, CTS
+runtime, polling slack, log parsing, ...). Spans are kept on the trial as the
+`phase_seconds` user attribute and streamed, as they close, to a JSONL event file
+and/or a Prometheus textfile (node_exporter textfile collector) with per-phase totals.
+"""
+
+import json
+import os
+import socket
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import optuna
+
+def worker_prom_path(prom_path: str, host: str, pid: int) -> str:
+    """Per-worker textfile name; node_exporter only collects files ending in .prom."""
+    root, ext = os.path.splitext(prom_path)
+    return f"{root}.{host}_{pid}{ext if ext == '.prom' else ext + '.prom'}"
+
+class MetricsSink:
+    """
+    Shared by all trials of a worker. Appends one JSONL event per closed span and
+    rewrites a Prometheus textfile (atomically) with the worker's running totals. Each
+    worker writes its own file next to `prom_path` (cts.prom -> cts.<host>_<pid>.prom),
+    so workers sharing a path and a node_exporter textfile directory do not overwrite
+    each other.
+    """
+    def __init__(self, jsonl_path: Optional[str] = None, prom_path: Optional[str] = None):
+        host, pid = socket.gethostname(), os.getpid()
+        self.jsonl_path = jsonl_path
+        self.prom_path = worker_prom_path(prom_path, host, pid) if prom_path else None
+        self.worker = f"{host}:{pid}"
+        self._totals: Dict[Tuple[str, str], float] = {}
+        self._counts: Dict[Tuple[str, str], int] = {}
+        self._last: Dict[Tuple[str, str], float] = {}
+        self._lock = threading.Lock()
+
+    def emit(self, study: str, trial: int, run_name: Optional[str], phase: str, seconds: float):
+        with self._lock:
+            key = (study, phase)
+            self._totals[key] = self._totals.get(key, 0.0) + seconds
+            self._counts[key] = self._counts.get(key, 0) + 1
+            self._last[key] = seconds
+            if self.jsonl_path:
+                with open(self.jsonl_path, 'a') as f:
+                    f.write(json.dumps({'ts': round(time.time(), 3), 'worker': self.worker, 'study': study,
+                                        'trial': trial, 'run_name': run_name, 'phase': phase,
+                                        'seconds': round(seconds, 3)}) + "\n")
+            if self.prom_path:
+                self._write_prom()
+
+    def _write_prom(self):
+        def labels(key: Tuple[str, str]) -> str:
+            study, phase = (v.replace('\\', '\\\\').replace('"', '\\"') for v in key)
+            return f'{{worker="{self.worker}",study="{study}",phase="{phase}"}}'
+
+        lines = [
+            "# HELP cts_trial_phase_seconds_total Wall-clock seconds spent in each trial phase.",
+            "# TYPE cts_trial_phase_seconds_total counter",
+            *(f"cts_trial_phase_seconds_total{labels(k)} {v:.3f}" for k, v in sorted(self._totals.items())),
+            "# HELP cts_trial_phase_count Number of trial phase spans recorded.",
+            "# TYPE cts_trial_phase_count counter",
+            *(f"cts_trial_phase_count{labels(k)} {v}" for k, v in sorted(self._counts.items())),
+            "# HELP cts_trial_phase_last_seconds Duration of the most recent span of each phase.",
+            "# TYPE cts_trial_phase_last_seconds gauge",
+            *(f"cts_trial_phase_last_seconds{labels(k)} {v:.3f}" for k, v in sorted(self._last.items())),
+        ]
+        tmp_path = f"{self.prom_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, self.prom_path)
+
+class PhaseTimer:
+    """
+    Phase spans of one trial. `lap(phase)` closes the span running since the previous
+    lap (or since the timer started); `record(phase, seconds)` adds a span measured
+    elsewhere (e.g. queue wait from Bob status timestamps). Repeated phases add up.
+    """
+    def __init__(self, trial: optuna.Trial, sink: Optional[MetricsSink] = None):
+        self.trial = trial
+        self.sink = sink
+        self.run_name: Optional[str] = None
+        self.spans: Dict[str, float] = {}
+        self.started = self._last = time.time()
+
+    def lap(self, phase: str):
+        now = time.time()
+        self.record(phase, now - self._last)
+        self._last = now
+
+    def record(self, phase: str, seconds: float):
+        seconds = max(0.0, seconds)
+        self.spans[phase] = self.spans.get(phase, 0.0) + seconds
+        if self.sink is not None:
+            self.sink.emit(self.trial.study.study_name, self.trial.number, self.run_name, phase, seconds)
+
+    def finish(self):
+        """Records the whole trial as 'total' and stores all spans on the trial."""
+        self.record('total', time.time() - self.started)
+        self.trial.set_user_attr('phase_seconds', {phase: round(s, 2) for phase, s in self.spans.items()})
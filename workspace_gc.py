@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+Workspace GC
+Retention manager for trial artifacts: the Bob run directory WA/run/<run_name>, its
+vars_<run_name>.var (and .tcl) and logs/<run_name>.log. Keeps the top-K and the most recent M
+trials and archives (tar + zstd, or tar.gz without the zstandard package) or deletes
+the rest, after making sure each run's skew-group rows are saved in its
+results/<run_name>.skew.json sidecar. Optionally evicts retained-but-recent runs,
+oldest first, to keep the study's artifacts under a disk budget.
+"""
+
+import argparse
+import fcntl
+import logging
+import os
+import shutil
+import stat
+import sys
+import tarfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+import optuna
+from optuna.trial import FrozenTrial, TrialState
+
+import cts_log_parser
+from storage_utils import open_storage
+
+try:
+    import zstandard
+except ImportError:  # Optional: archives fall back to .tar.gz
+    zstandard = None
+
+# --- Logging Configuration ---
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s [%(levelname)s] %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+logger = logging.getLogger(__name__)
+
+GC_ACTIONS = ('archive', 'delete')
+
+# Runs referenced by these trials are never touched (a retried trial may be attached to them)
+LIVE_STATES = (TrialState.RUNNING, TrialState.WAITING)
+
+# System attribute under which samplers store a trial's constraints_func values
+# (feasible when all are <= 0)
+CONSTRAINTS_ATTR = 'constraints'
+
+@dataclass
+class RetentionPolicy:
+    keep_top: int = 10
+    keep_recent: int = 10
+    action: str = 'archive'
+    budget_gb: Optional[float] = None
+    archive_dir: str = 'archive'
+
+@dataclass
+class TrialArtifacts:
+    run_name: str
+    run_dir: str
+    var_file: str
+    bash_log: str
+    sidecar: str
+    overrides_tcl: str  # Only written with --provision clone
+
+    @property
+    def clock_log(self) -> str:
+        return os.path.join(self.run_dir, 'main', 'pnr', 'clock', 'logs', 'clock.log')
+
+    def paths(self) -> List[str]:
+        """Artifacts that still exist on disk (the sidecar is always kept)."""
+        return [p for p in (self.run_dir, self.var_file, self.overrides_tcl, self.bash_log) if os.path.lexists(p)]
+
+    def size(self) -> int:
+        return sum(_tree_size(p) for p in self.paths())
+
+def _tree_size(path: str) -> int:
+    """Bytes used under `path`. Symlinks (the linked prerequisite stages) count as links only."""
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode):
+        return st.st_size
+    total = 0
+    for root, dirs, files in os.walk(path):
+        for name in dirs + files:
+            try:
+                st = os.lstat(os.path.join(root, name))
+            except OSError:
+                continue
+            if not stat.S_ISDIR(st.st_mode):
+                total += st.st_size
+    return total
+
+def top_trials(study: optuna.Study, trials: Sequence[FrozenTrial], k: int) -> Set[int]:
+    """
+    Numbers of the k best COMPLETE trials by the first objective, feasible trials
+    (per the sampler's constraints) ahead of infeasible ones. In multi-objective
+    studies the Pareto front is always kept as well.
+    """
+    complete = [t for t in trials if t.state == TrialState.COMPLETE and t.values]
+    sign = -1 if study.directions[0] == optuna.study.StudyDirection.MAXIMIZE else 1
+    best = {t.number for t in sorted(complete, key=lambda t: (not _feasible(t), sign * t.values[0]))[:k]}
+    if len(study.directions) > 1:
+        best.update(t.number for t in study.best_trials)
+    return best
+
+def _feasible(trial: FrozenTrial) -> bool:
+    """Trials without recorded constraints (e.g. --objective penalty) count as feasible."""
+    return all(c <= 0 for c in trial.system_attrs.get(CONSTRAINTS_ATTR, ()))
+
+class WorkspaceGC:
+    """
+    Applies a RetentionPolicy to the runs of a study. Also usable as a study.optimize
+    callback (`callbacks=[gc]`), so retention and the disk budget are enforced as
+    trials finish. The callback only queues a pass on a background thread, so archiving
+    never holds up the optimizer's ask/tell loop; callbacks that arrive while a pass
+    is already queued share it.
+    """
+    def __init__(self, wa_name: str, policy: RetentionPolicy, results_dir: str = 'results', dry_run: bool = False):
+        if policy.action not in GC_ACTIONS:
+            raise ValueError(f"Unknown GC action '{policy.action}'; expected one of {GC_ACTIONS}")
+        self.wa_name = wa_name
+        self.policy = policy
+        self.results_dir = results_dir
+        self.dry_run = dry_run
+        # Bytes per run whose trials have all finished: those runs no longer grow, so the
+        # per-trial budget check does not walk every run directory again
+        self._sizes: Dict[str, int] = {}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="gc")
+        self._lock = threading.Lock()
+        self._queued = False
+
+    def artifacts(self, run_name: str) -> TrialArtifacts:
+        return TrialArtifacts(
+            run_name=run_name,
+            run_dir=os.path.join(self.wa_name, 'run', run_name),
+            var_file=f"vars_{run_name}.var",
+            bash_log=os.path.join('logs', f"{run_name}.log"),
+            sidecar=os.path.join(self.results_dir, f"{run_name}.skew.json"),
+            overrides_tcl=f"vars_{run_name}.tcl"
+        )
+
+    def plan(self, study: optuna.Study,
+             trials: Sequence[FrozenTrial]) -> Tuple[List[TrialArtifacts], List[TrialArtifacts]]:
+        """
+        Returns (expired, evictable), both oldest first: runs outside the retention
+        policy, and runs kept only for being recent, which the disk budget may evict.
+        Runs of live or top-K trials are in neither list.
+        """
+        by_run: Dict[str, List[FrozenTrial]] = {}
+        for trial in trials:
+            run_name = trial.user_attrs.get('run_name')
+            if run_name:
+                by_run.setdefault(run_name, []).append(trial)
+
+        top = top_trials(study, trials, self.policy.keep_top)
+        numbers = sorted(t.number for owners in by_run.values() for t in owners)
+        recent = set(numbers[-self.policy.keep_recent:]) if self.policy.keep_recent > 0 else set()
+
+        expired, evictable = [], []
+        for run_name, owners in sorted(by_run.items(), key=lambda item: min(t.number for t in item[1])):
+            if any(t.state in LIVE_STATES or t.number in top for t in owners):
+                continue
+            artifacts = self.artifacts(run_name)
+            if not artifacts.paths():
+                continue
+            (evictable if any(t.number in recent for t in owners) else expired).append(artifacts)
+        return expired, evictable
+
+    def run_size(self, artifacts: TrialArtifacts, finished: bool) -> int:
+        """Bytes used by a run, cached once its trials are finished while its run dir exists."""
+        if finished and artifacts.run_name in self._sizes and os.path.lexists(artifacts.run_dir):
+            return self._sizes[artifacts.run_name]
+        size = artifacts.size()
+        if finished:
+            self._sizes[artifacts.run_name] = size
+        else:
+            self._sizes.pop(artifacts.run_name, None)
+        return size
+
+    def run(self, study: optuna.Study) -> int:
+        """Collects expired runs, then evicts recent ones while over budget. Returns bytes freed."""
+        trials = study.get_trials(deepcopy=False)
+        expired, evictable = self.plan(study, trials)
+        freed = sum(self.collect(a) for a in expired)
+
+        if self.policy.budget_gb is not None:
+            budget = self.policy.budget_gb * 1e9
+            live = {t.user_attrs.get('run_name') for t in trials if t.state in LIVE_STATES}
+            usage = sum(self.run_size(self.artifacts(run), run not in live)
+                        for run in {t.user_attrs.get('run_name') for t in trials} if run)
+            for artifacts in evictable:
+                if usage <= budget:
+                    break
+                released = self.collect(artifacts)
+                usage -= released
+                freed += released
+            if usage > budget:
+                logger.warning(f"Workspace GC: {usage / 1e9:.1f} GB still in use, over the "
+                               f"{self.policy.budget_gb:.1f} GB budget (top-{self.policy.keep_top} and live runs are kept).")
+        if freed:
+            logger.info(f"Workspace GC: freed {freed / 1e6:.1f} MB")
+        return freed
+
+    def __call__(self, study: optuna.Study, trial: FrozenTrial):
+        with self._lock:
+            if self._queued:
+                return
+            self._queued = True
+        self._executor.submit(self._run_queued, study)
+
+    def _run_queued(self, study: optuna.Study):
+        with self._lock:
+            # Trials finishing from here on need a pass that sees them
+            self._queued = False
+        try:
+            self.run(study)
+        except Exception as e:
+            logger.warning(f"Workspace GC failed: {type(e).__name__}: {e}")
+
+    def collect(self, artifacts: TrialArtifacts) -> int:
+        """Saves the skew sidecar, then archives or deletes one run. Returns bytes freed."""
+        if self.dry_run:
+            size = self.run_size(artifacts, True)
+            logger.info(f"[dry run] would {self.policy.action} {artifacts.run_name} ({size / 1e6:.1f} MB)")
+            return size
+        os.makedirs(self.policy.archive_dir, exist_ok=True)
+        lock = os.path.join(self.policy.archive_dir, f"{artifacts.run_name}.lock")
+        fd = os.open(lock, os.O_CREAT | os.O_RDWR, 0o644)
+        collected = False
+        try:
+            # Another worker's GC may be collecting the same run. The lock goes away with
+            # the process, so a crashed collector does not block the run forever.
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return 0
+            paths = artifacts.paths()
+            if not paths or not self._ensure_sidecar(artifacts):
+                return 0
+            size = self.run_size(artifacts, True)
+            if self.policy.action == 'archive':
+                archive = self._archive(artifacts, paths)
+                logger.info(f"Archived {artifacts.run_name} ({size / 1e6:.1f} MB) to {archive}")
+            else:
+                logger.info(f"Deleting {artifacts.run_name} ({size / 1e6:.1f} MB)")
+            for path in paths:
+                if os.path.isdir(path) and not os.path.islink(path):
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
+            self._sizes.pop(artifacts.run_name, None)
+            collected = True
+            return size
+        finally:
+            if collected:
+                # Only once the run is gone: a collector that raced for the old lock file
+                # finds nothing left to collect
+                os.remove(lock)
+            os.close(fd)
+
+    def _ensure_sidecar(self, artifacts: TrialArtifacts) -> bool:
+        """Makes sure the parsed skew-group rows outlive the run directory."""
+        if os.path.exists(artifacts.sidecar) or not os.path.exists(artifacts.clock_log):
+            return True
+        try:
+            table = cts_log_parser.parse_clock_log(artifacts.clock_log)
+            if len(table):
+                table.save_json(artifacts.sidecar)
+            return True
+        except Exception as e:
+            logger.warning(f"Keeping {artifacts.run_name}: could not save its skew sidecar: {e}")
+            return False
+
+    def _archive(self, artifacts: TrialArtifacts, paths: List[str]) -> str:
+        """Writes the run's artifacts to archive_dir/<run_name>.tar.zst (or .tar.gz). Symlinks stay links."""
+        suffix = '.tar.zst' if zstandard is not None else '.tar.gz'
+        archive = os.path.join(self.policy.archive_dir, artifacts.run_name + suffix)
+        tmp_path = archive + '.tmp'
+        arcnames = {
+            artifacts.run_dir: os.path.join('run', artifacts.run_name),
+            artifacts.var_file: os.path.basename(artifacts.var_file),
+            artifacts.overrides_tcl: os.path.basename(artifacts.overrides_tcl),
+            artifacts.bash_log: os.path.join('logs', os.path.basename(artifacts.bash_log)),
+        }
+        if zstandard is not None:
+            with open(tmp_path, 'wb') as raw, \
+                    zstandard.ZstdCompressor(level=10, threads=-1).stream_writer(raw) as stream, \
+                    tarfile.open(fileobj=stream, mode='w|') as tar:
+                for path in paths:
+                    tar.add(path, arcname=arcnames[path])
+        else:
+            with tarfile.open(tmp_path, 'w:gz') as tar:
+                for path in paths:
+                    tar.add(path, arcname=arcnames[path])
+        os.replace(tmp_path, archive)
+        return archive
+
+def add_policy_args(parser: argparse.ArgumentParser, prefix: str = ''):
+    """Retention options, shared with run_optuna_optimizer.py (which passes prefix='gc-')."""
+    parser.add_argument(f"--{prefix}keep-top", type=int, default=10, help="Always keep the runs of the K best trials")
+    parser.add_argument(f"--{prefix}keep-recent", type=int, default=10, help="Keep the runs of the M most recent trials")
+    parser.add_argument(f"--{prefix}budget-gb", type=float,
+                        help="Also evict recent runs (oldest first) while the study's runs exceed this size")
+    parser.add_argument(f"--{prefix}archive-dir", default="archive", help="Where archives and GC lock files go")
+
+def policy_from_args(args: argparse.Namespace, action: str, prefix: str = '') -> RetentionPolicy:
+    attr = prefix.replace('-', '_')
+    return RetentionPolicy(
+        keep_top=getattr(args, f"{attr}keep_top"),
+        keep_recent=getattr(args, f"{attr}keep_recent"),
+        action=action,
+        budget_gb=getattr(args, f"{attr}budget_gb"),
+        archive_dir=getattr(args, f"{attr}archive_dir")
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive or delete trial run directories outside the retention policy")
+    parser.add_argument("--storage", required=True, help="Storage URL (sqlite:///..., postgresql://...) or journal file")
+    parser.add_argument("--study-name", required=True, help="Optuna study name")
+    parser.add_argument("--wa-name", required=True, help="Bob Workspace Name")
+    parser.add_argument("--action", choices=GC_ACTIONS, default="archive", help="What to do with expired runs")
+    parser.add_argument("--results-dir", default="results", help="Directory of the <run>.skew.json sidecars")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would be collected")
+    add_policy_args(parser)
+    args = parser.parse_args()
+
+    try:
+        study = optuna.load_study(study_name=args.study_name, storage=open_storage(args.storage))
+    except KeyError:
+        logger.error(f"Study '{args.study_name}' not found.")
+        sys.exit(1)
+
+    gc = WorkspaceGC(args.wa_name, policy_from_args(args, args.action), args.results_dir, args.dry_run)
+    gc.run(study)
+
+if __name__ == "__main__":
+    main()